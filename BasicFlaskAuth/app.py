@@ -4,12 +4,16 @@ from functools import wraps
 from jose import jwt
 from urllib.request import urlopen
 
+from token_cache import TokenCache
+
 
 app = Flask(__name__)
 
 AUTH0_DOMAIN = 'hs-dev-auth.auth0.com'
 ALGORITHMS = ['HS256']
 API_AUDIENCE = 'https://hs-dev-auth.auth0.com/api/v2/'
+# payloads of verified tokens until they expire, see token_cache.py
+verified_tokens = TokenCache(max_size=10000)
 
 
 class AuthError(Exception):
@@ -114,7 +118,7 @@ def requires_auth(f):
     def wrapper(*args, **kwargs):
         token = get_token_auth_header()
         try:
-            payload = verify_decode_jwt(token)
+            payload = verified_tokens.verify(token, verify_decode_jwt)
         except:
             abort(401)
         return f(payload, *args, **kwargs)
@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    """
+    TokenCache
+    a bounded LRU cache of verified jwt payloads, so a bearer token that
+    is sent again is not parsed and its RS256 signature not verified again
+
+        entries are keyed by the sha256 of the token, the token itself is
+        not kept
+        an entry expires at the exp claim of its token, tokens without exp
+        are not cached
+        once max_size tokens are cached, the least recently used is evicted
+        only verified payloads are stored, failed tokens verify every time
+    """
+
+    def __init__(self, max_size=10000, clock=time.time):
+        self.max_size = max_size
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        """
+        get(token)
+            returns a copy of the cached payload of token
+            or None if it is not cached or expired
+        """
+        key = self.key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if self.clock() < expires_at:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(payload)
+                del self.entries[key]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def set(self, token, payload):
+        """
+        set(token, payload)
+            caches the verified payload of token until its exp claim
+        """
+        try:
+            expires_at = float(payload['exp'])
+        except (KeyError, TypeError, ValueError):
+            return
+        key = self.key(token)
+        with self.lock:
+            self.entries[key] = (expires_at, dict(payload))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+
+    def verify(self, token, verify):
+        """
+        verify(token, verify)
+            returns the payload of token, calls verify(token) and caches
+            its result if the token is not cached
+        """
+        payload = self.get(token)
+        if payload is None:
+            payload = verify(token)
+            self.set(token, payload)
+        return payload
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -3,18 +3,27 @@
 #----------------------------------------------------------------------------#
 
 import json
+import bisect
+import csv
+import click
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from babel.dates import parse_pattern
+from functools import lru_cache
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, stream_with_context, jsonify
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ARRAY, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, ARRAY, ForeignKey, and_, func, tuple_, event
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+from search import make_search
+from dbpool import pool_stats
+from profiling import init_profiling
 from flask_migrate import Migrate
 from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
 import sys
 #----------------------------------------------------------------------------#
 # App Config.
@@ -25,6 +34,7 @@ moment = Moment(app)
 app.config.from_object('config')
 db = SQLAlchemy(app)
 my_migrate = Migrate(app, db)
+init_profiling(app)
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -33,6 +43,11 @@ my_migrate = Migrate(app, db)
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    # same index as migration 3f1c9a2b7d10
+    __table_args__ = (
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
@@ -61,6 +76,11 @@ Show = db.Table('Show',
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    # same index as migration 3f1c9a2b7d10
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
@@ -80,6 +100,12 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    # same indexes as migration 7b2e4d9c1a55
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time', 'start_time', 'venue_id', 'artist_id'),
+    )
 
     venue_id = Column(Integer, ForeignKey('Venue.id'), primary_key=True)
     artist_id = Column(Integer, ForeignKey('Artist.id'), primary_key=True)
@@ -91,23 +117,244 @@ class Show(db.Model):
         return f'<Show {self.id} {self.venue_id} {self.artist_id} {self.start_time}>'
 
 
+@event.listens_for(db.metadata, 'before_create')
+def create_pg_trgm(target, connection, **kw):
+    # the trigram indexes of Venue and Artist need pg_trgm, for create_all()
+    # as for migration 3f1c9a2b7d10
+    if connection.dialect.name != 'postgresql':
+        return
+    if connection.execute("SELECT 1 FROM pg_available_extensions "
+                          "WHERE name = 'pg_trgm'").scalar():
+        connection.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        return
+    # a server without pg_trgm gets the tables without them,
+    # search it with SEARCH_BACKEND=memory
+    for table in (Venue.__table__, Artist.__table__):
+        for index in list(table.indexes):
+            if index.name.endswith('_trgm'):
+                table.indexes.discard(index)
+
+
+venue_search = make_search(app.config['SEARCH_BACKEND'], db, Venue)
+artist_search = make_search(app.config['SEARCH_BACKEND'], db, Artist)
+
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+# patterns are compiled once, the filter only has to apply them
+DATETIME_PATTERNS = {name: parse_pattern(pattern) for name, pattern in DATETIME_FORMATS.items()}
+DATETIME_LOCALE = babel.Locale.parse(babel.dates.LC_TIME)
+
+
+@lru_cache(maxsize=4096)
 def format_datetime(value, format='full'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
+    # accepts datetime objects as well as strings, strings are parsed once
+    # per distinct value thanks to the cache
+    if isinstance(value, datetime):
+        date = value
+    else:
+        date = dateutil.parser.parse(value)
+    if format in DATETIME_PATTERNS:
+        return DATETIME_PATTERNS[format].apply(date, DATETIME_LOCALE)
     return babel.dates.format_datetime(date, format)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
 
 
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+
+def venue_areas(current_time=None):
+    # group venues by city/state with the number of upcoming shows per venue.
+    # the counting is done by one grouped query, rows are streamed in
+    # city/state order so each area is built in a single pass.
+    if current_time is None:
+        current_time = datetime.now()
+    num_upcoming_shows = func.count(Show.venue_id)
+    venue_rows = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state, num_upcoming_shows
+    ).outerjoin(
+        Show, and_(Show.venue_id == Venue.id, Show.start_time > current_time)
+    ).group_by(
+        Venue.id, Venue.name, Venue.city, Venue.state
+    ).order_by(
+        Venue.city, Venue.state, Venue.id
+    ).yield_per(1000)
+    areas = []
+    for venue_id, venue_name, city, state, upcoming_count in venue_rows:
+        if not areas or areas[-1]['city'] != city or areas[-1]['state'] != state:
+            # New venue location
+            areas.append({'city': city, 'state': state, 'venues': []})
+        areas[-1]['venues'].append({
+            'id': venue_id,
+            'name': venue_name,
+            'num_upcoming_shows': upcoming_count
+        })
+    return areas
+
+
+def show_rows():
+    # the six columns the show listing renders, joined in one query
+    # and ordered by the (start_time, venue_id, artist_id) keyset
+    return db.session.query(
+        Show.venue_id, Venue.name, Show.artist_id, Artist.name, Artist.image_link, Show.start_time
+    ).join(
+        Venue, Venue.id == Show.venue_id
+    ).join(
+        Artist, Artist.id == Show.artist_id
+    ).order_by(
+        Show.start_time, Show.venue_id, Show.artist_id
+    )
+
+
+def show_to_dict(row):
+    venue_id, venue_name, artist_id, artist_name, artist_image_link, start_time = row
+    return {
+        'venue_id': venue_id,
+        'venue_name': venue_name,
+        'artist_id': artist_id,
+        'artist_name': artist_name,
+        'artist_image_link': artist_image_link,
+        'start_time': str(start_time)
+    }
+
+
+def encode_show_cursor(show):
+    return '{}_{}_{}'.format(show['start_time'].replace(' ', 'T'), show['venue_id'], show['artist_id'])
+
+
+def decode_show_cursor(cursor):
+    # inverse of encode_show_cursor, returns None for a malformed cursor
+    try:
+        start_time, venue_id, artist_id = cursor.split('_')
+        return dateutil.parser.parse(start_time), int(venue_id), int(artist_id)
+    except (ValueError, OverflowError):
+        return None
+
+
+def show_page_query(after=None, limit=100):
+    # the shows strictly after the given keyset, one more than the page size
+    # so the caller can tell whether there is a next page
+    query = show_rows()
+    if after is not None:
+        query = query.filter(tuple_(Show.start_time, Show.venue_id, Show.artist_id) > tuple_(*after))
+    return query.limit(limit + 1)
+
+
+def show_timeline_page(after=None, limit=100):
+    # one page of shows strictly after the given keyset, plus the cursor of
+    # the next page (None on the last page)
+    page = [show_to_dict(row) for row in show_page_query(after, limit)]
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_show_cursor(page[-1])
+    return page, next_cursor
+
+
+def stream_template(template_name, **context):
+    # render a template in chunks so large listings never sit in memory
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    rendered = template.stream(context)
+    rendered.enable_buffering(50)
+    return rendered
+
+
+def artist_page(after=0, limit=100):
+    # id and name of the artists following the id `after`, plus the cursor of
+    # the next page (None on the last page)
+    artist_rows = db.session.query(Artist.id, Artist.name).filter(
+        Artist.id > after
+    ).order_by(Artist.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(artist_rows) > limit:
+        artist_rows = artist_rows[:limit]
+        next_cursor = artist_rows[-1][0]
+    return [{'id': artist_id, 'name': name} for artist_id, name in artist_rows], next_cursor
+
+
+# show lists of the venue and artist pages, keyed by ('venue', id) / ('artist', id).
+# only used when SHOW_LIST_CACHE is enabled; entries are dropped whenever a
+# show, venue or artist they were built from changes.
+show_list_cache = {}
+
+
+def entity_show_query(entity_type, entity_id):
+    # every show of one venue (or artist) with the counterpart's id, name
+    # and image joined in, ordered by start time
+    if entity_type == 'venue':
+        counterpart, own_id, other_id = Artist, Show.venue_id, Show.artist_id
+    else:
+        counterpart, own_id, other_id = Venue, Show.artist_id, Show.venue_id
+    return db.session.query(
+        other_id, counterpart.name, counterpart.image_link, Show.start_time
+    ).join(
+        counterpart, counterpart.id == other_id
+    ).filter(
+        own_id == entity_id
+    ).order_by(Show.start_time)
+
+
+def entity_show_list(entity_type, entity_id):
+    # returns (start_times, shows) of a venue or artist page
+    prefix = 'artist' if entity_type == 'venue' else 'venue'
+    show_data = entity_show_query(entity_type, entity_id)
+    start_times = []
+    show_list = []
+    for show_other_id, name, image_link, start_time in show_data:
+        start_times.append(start_time)
+        show_list.append({
+            prefix + '_id': show_other_id,
+            prefix + '_name': name,
+            prefix + '_image_link': image_link,
+            'start_time': str(start_time)
+        })
+    return start_times, show_list
+
+
+def entity_shows(entity_type, entity_id, current_time=None):
+    # past and upcoming shows of a venue or artist page. the list is sorted by
+    # start time, so the split is a single bisect and cached lists stay correct
+    # as shows move from upcoming to past
+    if current_time is None:
+        current_time = datetime.now()
+    key = (entity_type, entity_id)
+    if app.config['SHOW_LIST_CACHE'] and key in show_list_cache:
+        start_times, show_list = show_list_cache[key]
+    else:
+        start_times, show_list = entity_show_list(entity_type, entity_id)
+        if app.config['SHOW_LIST_CACHE']:
+            show_list_cache[key] = (start_times, show_list)
+    split = bisect.bisect_right(start_times, current_time)
+    return {
+        'past_shows': show_list[:split],
+        'past_shows_count': split,
+        'upcoming_shows': show_list[split:],
+        'upcoming_shows_count': len(show_list) - split,
+    }
+
+
+def invalidate_show_lists(venue_id=None, artist_id=None):
+    # without arguments the whole cache is dropped, used when a venue or artist
+    # changes since its name and image appear on the counterpart pages
+    if venue_id is None and artist_id is None:
+        show_list_cache.clear()
+        return
+    show_list_cache.pop(('venue', venue_id), None)
+    show_list_cache.pop(('artist', artist_id), None)
+
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -122,33 +369,7 @@ def index():
 #  ----------------------------------------------------------------
 @app.route('/venues')
 def venues():
-    current_time = datetime.now()
-    venue_data = db.session.query(Venue).order_by(Venue.city).all()
-    data = []
-    for venue_item in venue_data:
-        upcoming_shows = 0
-        for show in venue_item.shows:
-            if show.start_time > current_time:
-                upcoming_shows += 1
-        if not data or data[-1]['city']+data[-1]['state'] != venue_item.city+venue_item.state:
-            # New venue location
-            data += [{
-                'city': venue_item.city,
-                'state': venue_item.state,
-                'venues': [{
-                    'id': venue_item.id,
-                    'name': venue_item.name,
-                    'num_upcoming_shows': upcoming_shows
-                }]
-            }]
-        else:
-            # same venue location as previous one
-            data[-1]['venues'] += [{
-                'id': venue_item.id,
-                'name': venue_item.name,
-                'num_upcoming_shows': upcoming_shows
-            }]
-    return render_template('pages/venues.html', areas=data)
+    return render_template('pages/venues.html', areas=venue_areas())
 
 
 @app.route('/venues/search', methods=['POST'])
@@ -156,11 +377,10 @@ def search_venues():
     # implement search on artists with partial string search. Ensure it is case-insensitive.
     # search for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-    venue_data = db.session.query(Venue).filter(Venue.name.ilike('%' + request.form['search_term'] + '%')).order_by(
-      Venue.id)
+    venue_data = venue_search.search(request.form['search_term'])
     data = []
-    for venue_item in venue_data:
-        data += [{'id': venue_item.id, 'name': venue_item.name}]
+    for venue_id, venue_name in venue_data:
+        data += [{'id': venue_id, 'name': venue_name}]
     results = {'count': len(data), 'data': data}
     return render_template('pages/search_venues.html', results=results, search_term=request.form.get('search_term', ''))
 
@@ -186,29 +406,7 @@ def show_venue(venue_id):
         'seeking_description': venue_data.seeking_description,
         'image_link': venue_data.image_link,
     }
-    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    upcoming_shows = db.session.query(Show).filter(Show.venue_id == venue_id, Show.start_time > current_time).all()
-    upcoming_shows_list = []
-    for show_item in upcoming_shows:
-        upcoming_shows_list += [{
-            'artist_id': show_item.artist_id,
-            'artist_name': show_item.Artist.name,
-            'artist_image_link': show_item.Artist.image_link,
-            'start_time': str(show_item.start_time)
-            }]
-    venue_to_display['upcoming_shows'] = upcoming_shows_list
-    venue_to_display['upcoming_shows_count'] = len(upcoming_shows_list)
-    past_shows = db.session.query(Show).filter(Show.venue_id == venue_id, Show.start_time <= current_time).all()
-    past_shows_list = []
-    for show_item in past_shows:
-        past_shows_list += [{
-            'artist_id': show_item.artist_id,
-            'artist_name': show_item.Artist.name,
-            'artist_image_link': show_item.Artist.image_link,
-            'start_time': str(show_item.start_time)
-            }]
-    venue_to_display['past_shows'] = past_shows_list
-    venue_to_display['past_shows_count'] = len(past_shows_list)
+    venue_to_display.update(entity_shows('venue', venue_id))
     return render_template('pages/show_venue.html', venue=venue_to_display)
 
 
@@ -246,7 +444,10 @@ def create_venue_submission():
             seeking_description=seeking_description
         )
         db.session.add(new_venue)
+        db.session.flush()
+        new_venue_id = new_venue.id
         db.session.commit()
+        venue_search.add(new_venue_id, request.form['name'])
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except SQLAlchemyError:
         db.session.rollback()
@@ -269,6 +470,8 @@ def delete_venue(venue_id):
         to_delete_name = to_delete.name
         db.session.delete(to_delete)
         db.session.commit()
+        invalidate_show_lists()
+        venue_search.remove(int(venue_id))
         flash('Venue ' + to_delete_name + ' was successfully deleted!')
     except SQLAlchemyError:
         db.session.rollback()
@@ -283,17 +486,15 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-    # replace with real data returned from querying the database
-    artist_data = db.session.query(Artist).order_by(Artist.id).all()
-    if not artist_data:
+    # one page of artists ordered by id, ?after=<last id of the previous page>.
+    # ?format=json returns the same page as json
+    after = request.args.get('after', 0, type=int)
+    artists_to_display, next_cursor = artist_page(after, app.config['ARTISTS_PER_PAGE'])
+    if not artists_to_display and not after:
         return render_template('errors/404.html')
-    artists_to_display = []
-    for artist_item in artist_data:
-        artists_to_display += [{
-            'id': artist_item.id,
-            'name': artist_item.name
-        }]
-    return render_template('pages/artists.html', artists=artists_to_display)
+    if request.args.get('format') == 'json':
+        return jsonify({'artists': artists_to_display, 'next': next_cursor})
+    return render_template('pages/artists.html', artists=artists_to_display, next_cursor=next_cursor)
 
 
 @app.route('/artists/search', methods=['POST'])
@@ -301,10 +502,10 @@ def search_artists():
     # implement search on artists with partial string search. Ensure it is case-insensitive.
     # search for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
-    artist_data = db.session.query(Artist).filter(Artist.name.ilike('%'+request.form['search_term']+'%')).order_by(Artist.id)
+    artist_data = artist_search.search(request.form['search_term'])
     data = []
-    for artist_item in artist_data:
-        data += [{'id': artist_item.id, 'name': artist_item.name}]
+    for artist_id, artist_name in artist_data:
+        data += [{'id': artist_id, 'name': artist_name}]
     results = {'count': len(data), 'data': data}
     return render_template('pages/search_artists.html', results=results, search_term=request.form.get('search_term', ''))
 
@@ -327,29 +528,7 @@ def show_artist(artist_id):
         'seeking_description': artist_data.seeking_description,
         'image_link': artist_data.image_link,
     }
-    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    upcoming_shows = db.session.query(Show).filter(Show.artist_id == artist_id, Show.start_time > current_time).all()
-    upcoming_shows_list = []
-    for show_item in upcoming_shows:
-        upcoming_shows_list += [{
-            'venue_id': show_item.artist_id,
-            'venue_name': show_item.Artist.name,
-            'venue_image_link': show_item.Artist.image_link,
-            'start_time': str(show_item.start_time)
-            }]
-    artist_to_display['upcoming_shows'] = upcoming_shows_list
-    artist_to_display['upcoming_shows_count'] = len(upcoming_shows_list)
-    past_shows = db.session.query(Show).filter(Show.artist_id == artist_id, Show.start_time <= current_time).all()
-    past_shows_list = []
-    for show_item in past_shows:
-        past_shows_list += [{
-            'venue_id': show_item.artist_id,
-            'venue_name': show_item.Artist.name,
-            'venue_image_link': show_item.Artist.image_link,
-            'start_time': str(show_item.start_time)
-            }]
-    artist_to_display['past_shows'] = past_shows_list
-    artist_to_display['past_shows_count'] = len(past_shows_list)
+    artist_to_display.update(entity_shows('artist', artist_id))
     return render_template('pages/show_artist.html', artist=artist_to_display)
 
 
@@ -414,6 +593,8 @@ def edit_artist_submission(artist_id):
         artist_data.seeking_description = seeking_description
         artist_data.seeking_venue = seeking_venue
         db.session.commit()
+        invalidate_show_lists()
+        artist_search.add(artist_id, request.form['name'])
     except SQLAlchemyError:
         db.session.rollback()
         flash('An error occurred. Artist could not be edited.')
@@ -484,6 +665,8 @@ def edit_venue_submission(venue_id):
         venue_data.seeking_description = seeking_description
         venue_data.seeking_talent = seeking_talent
         db.session.commit()
+        invalidate_show_lists()
+        venue_search.add(venue_id, request.form['name'])
     except SQLAlchemyError:
         db.session.rollback()
         flash('An error occurred. venue could not be edited.')
@@ -531,7 +714,10 @@ def create_artist_submission():
             seeking_description=seeking_description,
         )
         db.session.add(new_artist)
+        db.session.flush()
+        new_artist_id = new_artist.id
         db.session.commit()
+        artist_search.add(new_artist_id, request.form['name'])
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except SQLAlchemyError:
         db.session.rollback()
@@ -546,25 +732,18 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 @app.route('/shows')
 def shows():
-    # displays list of shows at /shows
-    # replace with real venues data.
-    # num_shows should be aggregated based on number of upcoming shows per venue.
-    # show_data = db.session.query(Show, Artist, Venue).filter(Show.venue_id == Venue.id, Show.artist_id == Artist.id).order_by(Show.start_time)
-    # show_data = Show.query.options(db.joinedload(Show.Venue), db.joinedload(Show.Artist)).all()
-    show_data = db.session.query(Show).order_by(Show.start_time)
-    if not show_data:
-        return render_template('errors/404.html')
-    show_to_display = []
-    for show_item in show_data:
-        show_to_display += [{
-            'venue_id': show_item.Venue.id,
-            'venue_name': show_item.Venue.name,
-            'artist_id': show_item.Artist.id,
-            'artist_name': show_item.Artist.name,
-            'artist_image_link': show_item.Artist.image_link,
-            'start_time': str(show_item.start_time)
-        }]
-    return render_template('pages/shows.html', shows=show_to_display)
+    # displays list of shows at /shows, one keyset page at a time.
+    # ?stream=1 renders the whole listing while streaming rows from the database
+    if request.args.get('stream') == '1':
+        show_stream = (show_to_dict(row) for row in show_rows().yield_per(1000))
+        return Response(stream_with_context(stream_template('pages/shows.html', shows=show_stream)))
+    after = None
+    if request.args.get('after'):
+        after = decode_show_cursor(request.args['after'])
+        if after is None:
+            abort(400)
+    show_to_display, next_cursor = show_timeline_page(after, app.config['SHOWS_PER_PAGE'])
+    return render_template('pages/shows.html', shows=show_to_display, next_cursor=next_cursor)
 
 
 @app.route('/shows/create')
@@ -594,6 +773,7 @@ def create_show_submission():
         )
         db.session.add(new_show)
         db.session.commit()
+        invalidate_show_lists(venue_id=int(request.form['venue_id']), artist_id=int(request.form['artist_id']))
         flash('Show was successfully listed!')
     except SQLAlchemyError:
         db.session.rollback()
@@ -605,6 +785,29 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+#  Debug
+#  ----------------------------------------------------------------
+@app.route('/_debug/pool')
+def debug_pool():
+    # connection pool metrics, only served in debug mode
+    if not app.debug:
+        abort(404)
+    return jsonify(pool_stats(db.engine.pool))
+
+
+request_count = 0
+
+
+@app.after_request
+def log_pool_metrics(response):
+    global request_count
+    if app.config['POOL_METRICS_LOG_EVERY']:
+        request_count += 1
+        if request_count % app.config['POOL_METRICS_LOG_EVERY'] == 0:
+            app.logger.info('db pool %s', json.dumps(pool_stats(db.engine.pool)))
+    return response
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -615,6 +818,120 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+IMPORT_KINDS = {
+    'venues': (Venue, VenueForm),
+    'artists': (Artist, ArtistForm),
+    'shows': (Show, ShowForm),
+}
+
+
+def read_records(path):
+    # yields one dict per record of a .csv, .jsonl or .json file.
+    # csv and jsonl are streamed, a .json array has to be loaded at once
+    with open(path, newline='') as source:
+        if path.endswith('.csv'):
+            for record in csv.DictReader(source):
+                if record.get('genres'):
+                    record['genres'] = record['genres'].split(',')
+                yield record
+        elif path.endswith('.jsonl'):
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for record in json.load(source):
+                yield record
+
+
+def record_to_row(form_class, record):
+    # validates a record with the same rules as the create forms and returns
+    # (row, errors) where row is ready to be inserted
+    formdata = MultiDict()
+    for key, value in record.items():
+        if isinstance(value, list):
+            formdata.setlist(key, [str(item) for item in value])
+        elif isinstance(value, bool):
+            formdata[key] = 'y' if value else ''
+        elif value is not None:
+            formdata[key] = str(value)
+    form = form_class(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+    row = dict(form.data)
+    row.pop('csrf_token', None)
+    if form_class is ShowForm:
+        try:
+            row['venue_id'] = int(row['venue_id'])
+            row['artist_id'] = int(row['artist_id'])
+        except ValueError:
+            return None, {'id': ['venue_id and artist_id must be integers.']}
+    return row, None
+
+
+def import_records(kind, path, batch_size=1000, echo=print):
+    # inserts the records of a file in batches of batch_size rows, every batch
+    # is one executemany and one commit. invalid rows and failing batches are
+    # reported and skipped. returns (inserted, rejected)
+    model, form_class = IMPORT_KINDS[kind]
+    inserted = rejected = 0
+    batch = []
+    batch_number = 0
+
+    def flush(batch, batch_number):
+        try:
+            db.session.execute(model.__table__.insert(), batch)
+            db.session.commit()
+            return len(batch)
+        except SQLAlchemyError as error:
+            db.session.rollback()
+            echo(f'batch {batch_number}: {len(batch)} rows rejected: {error.__class__.__name__}: '
+                 f'{str(error.orig if hasattr(error, "orig") else error).strip()}')
+            return 0
+
+    for line_number, record in enumerate(read_records(path), start=1):
+        row, errors = record_to_row(form_class, record)
+        if errors:
+            rejected += 1
+            echo(f'record {line_number}: {errors}')
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            batch_number += 1
+            done = flush(batch, batch_number)
+            inserted += done
+            rejected += len(batch) - done
+            batch = []
+    if batch:
+        batch_number += 1
+        done = flush(batch, batch_number)
+        inserted += done
+        rejected += len(batch) - done
+    db.session.close()
+    # the show list cache and the memory search index live in the server
+    # process, which does not see these rows: restart it after an import
+    return inserted, rejected
+
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORT_KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per insert and commit.')
+def import_command(kind, path, batch_size):
+    """Bulk import venues, artists or shows from a .csv, .jsonl or .json file.
+
+    Restart a running server afterwards if it uses SHOW_LIST_CACHE=true or
+    SEARCH_BACKEND=memory, its caches do not see the imported rows.
+    """
+    start = datetime.now()
+    inserted, rejected = import_records(kind, path, batch_size, echo=click.echo)
+    seconds = max((datetime.now() - start).total_seconds(), 1e-6)
+    click.echo(f'{inserted} {kind} imported, {rejected} rejected, {inserted / seconds:.0f} rows/s')
+
+
 if not app.debug:
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
@@ -0,0 +1,347 @@
+'''
+Benchmarks for the fyyur data paths.
+
+Point DATABASE_URL at a scratch postgres database before running,
+the seed step drops and recreates every table:
+
+    $ export DATABASE_URL=postgresql://localhost:5432/fyyur_bench
+    $ python benchmark.py venues
+'''
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import app, db, Venue, Artist, Show, venue_areas, show_rows, show_timeline_page, entity_shows, artist_page, \
+    format_datetime, import_records
+from search import DatabaseSearch, MemorySearch
+
+RUNS = 5
+# size of the dataset currently in the scratch database
+seeded = None
+
+
+class QueryCounter(object):
+    # counts the statements sent to the database while the block runs
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+
+
+def measure(label, fn, runs=RUNS):
+    timings = []
+    queries = 0
+    for _ in range(runs):
+        db.session.expunge_all()
+        with QueryCounter() as counter:
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        queries = counter.count
+    timings.sort()
+    print(f'{label:<28} queries={queries:<8} '
+          f'median={timings[len(timings) // 2] * 1000:9.1f}ms '
+          f'max={timings[-1] * 1000:9.1f}ms')
+
+
+def percentiles(label, fn, args):
+    # p50/p99 latency of fn over a list of arguments
+    timings = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f'{label:<28} p50={timings[len(timings) // 2] * 1000:9.2f}ms '
+          f'p99={timings[int(len(timings) * 0.99)] * 1000:9.2f}ms')
+
+
+def seed(num_venues, num_artists, num_shows, chunk=10000):
+    global seeded
+    if seeded == (num_venues, num_artists, num_shows):
+        return
+    seeded = (num_venues, num_artists, num_shows)
+    db.drop_all()
+    db.create_all()
+    cities = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+              ('Seattle', 'WA'), ('Chicago', 'IL'), ('Boston', 'MA')]
+    venue_rows = []
+    for i in range(1, num_venues + 1):
+        city, state = cities[i % len(cities)]
+        venue_rows.append({'id': i, 'name': f'Venue {i}', 'city': city, 'state': state,
+                           'genres': ['Jazz'], 'image_link': ''})
+    db.session.bulk_insert_mappings(Venue, venue_rows)
+    artist_rows = [{'id': i, 'name': f'Artist {i}', 'city': 'Austin', 'state': 'TX',
+                    'genres': ['Jazz'], 'image_link': ''} for i in range(1, num_artists + 1)]
+    db.session.bulk_insert_mappings(Artist, artist_rows)
+    db.session.commit()
+    # (venue_id, artist_id) is the primary key of Show, so draw unique pairs
+    now = datetime.now()
+    pairs = random.sample(range(num_venues * num_artists), num_shows)
+    for offset in range(0, num_shows, chunk):
+        db.session.bulk_insert_mappings(Show, [{
+            'venue_id': pair // num_artists + 1,
+            'artist_id': pair % num_artists + 1,
+            'start_time': now + timedelta(days=random.randint(-365, 365))
+        } for pair in pairs[offset:offset + chunk]])
+        db.session.commit()
+
+
+def seed_artist_names(num_artists, chunk=50000):
+    global seeded
+    if seeded == ('artist names', num_artists):
+        return
+    seeded = ('artist names', num_artists)
+    db.drop_all()
+    db.create_all()
+    first = ['The', 'Wild', 'Blue', 'Electric', 'Velvet', 'Midnight', 'Golden', 'Silent', 'Neon']
+    second = ['Sax', 'Petals', 'Hop', 'Riders', 'Echoes', 'Owls', 'Strings', 'Collective', 'Band']
+    for offset in range(0, num_artists, chunk):
+        db.session.bulk_insert_mappings(Artist, [{
+            'id': i,
+            'name': f'{random.choice(first)} {random.choice(second)} {random.choice(second)} {i}',
+            'genres': ['Jazz'],
+        } for i in range(offset + 1, min(offset + chunk, num_artists) + 1)])
+        db.session.commit()
+
+
+#----------------------------------------------------------------------------#
+# Previous implementations, kept here to compare against.
+#----------------------------------------------------------------------------#
+
+
+def legacy_venue_areas():
+    current_time = datetime.now()
+    venue_data = db.session.query(Venue).order_by(Venue.city).all()
+    data = []
+    for venue_item in venue_data:
+        upcoming_shows = 0
+        for show in venue_item.shows:
+            if show.start_time > current_time:
+                upcoming_shows += 1
+        if not data or data[-1]['city']+data[-1]['state'] != venue_item.city+venue_item.state:
+            data += [{
+                'city': venue_item.city,
+                'state': venue_item.state,
+                'venues': [{'id': venue_item.id, 'name': venue_item.name,
+                            'num_upcoming_shows': upcoming_shows}]
+            }]
+        else:
+            data[-1]['venues'] += [{'id': venue_item.id, 'name': venue_item.name,
+                                    'num_upcoming_shows': upcoming_shows}]
+    return data
+
+
+def legacy_shows():
+    show_data = db.session.query(Show).order_by(Show.start_time)
+    show_to_display = []
+    for show_item in show_data:
+        show_to_display += [{
+            'venue_id': show_item.Venue.id,
+            'venue_name': show_item.Venue.name,
+            'artist_id': show_item.Artist.id,
+            'artist_name': show_item.Artist.name,
+            'artist_image_link': show_item.Artist.image_link,
+            'start_time': str(show_item.start_time)
+        }]
+    return show_to_display
+
+
+def legacy_venue_shows(venue_id):
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    result = {}
+    for label, condition in (('upcoming_shows', Show.start_time > current_time),
+                             ('past_shows', Show.start_time <= current_time)):
+        shows = db.session.query(Show).filter(Show.venue_id == venue_id, condition).all()
+        result[label] = [{
+            'artist_id': show_item.artist_id,
+            'artist_name': show_item.Artist.name,
+            'artist_image_link': show_item.Artist.image_link,
+            'start_time': str(show_item.start_time)
+        } for show_item in shows]
+    return result
+
+
+def legacy_artists():
+    artist_data = db.session.query(Artist).order_by(Artist.id).all()
+    return [{'id': artist_item.id, 'name': artist_item.name} for artist_item in artist_data]
+
+
+def legacy_format_datetime(value, format='full'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def legacy_search_artists(term):
+    artist_data = db.session.query(Artist).filter(Artist.name.ilike('%'+term+'%')).order_by(Artist.id)
+    return [{'id': artist_item.id, 'name': artist_item.name} for artist_item in artist_data]
+
+
+#----------------------------------------------------------------------------#
+# Benchmarks.
+#----------------------------------------------------------------------------#
+
+
+def bench_venues():
+    seed(num_venues=10000, num_artists=1000, num_shows=200000)
+    print('/venues at 10k venues / 200k shows')
+    measure('legacy (lazy venue.shows)', legacy_venue_areas, runs=1)
+    measure('venue_areas (grouped)', venue_areas)
+
+
+def bench_shows():
+    seed(num_venues=10000, num_artists=1000, num_shows=200000)
+    print('/shows at 10k venues / 200k shows')
+    measure('legacy (lazy Venue/Artist)', legacy_shows, runs=1)
+    measure('first page', lambda: show_timeline_page(limit=100))
+    middle = db.session.query(Show.start_time, Show.venue_id, Show.artist_id).order_by(
+        Show.start_time, Show.venue_id, Show.artist_id).offset(100000).first()
+    measure('page after 100k shows', lambda: show_timeline_page(tuple(middle), limit=100))
+    measure('full stream', lambda: sum(1 for _ in show_rows().yield_per(1000)))
+
+
+def bench_detail():
+    seed(num_venues=10000, num_artists=1000, num_shows=200000)
+    print('venue detail show lists at 10k venues / 200k shows')
+    venue_id = random.randint(1, 10000)
+    measure('legacy (2 queries + lazy)', lambda: legacy_venue_shows(venue_id))
+    app.config['SHOW_LIST_CACHE'] = False
+    measure('entity_shows', lambda: entity_shows('venue', venue_id))
+    app.config['SHOW_LIST_CACHE'] = True
+    measure('entity_shows (cached)', lambda: entity_shows('venue', venue_id))
+
+
+def bench_search():
+    seed_artist_names(1000000)
+    print('artist search at 1M artists')
+    terms = [str(random.randint(1, 1000000)) for _ in range(100)] + \
+        ['Velvet Owls', 'petals hop', 'Neon Band Sax'] * 10
+    percentiles('legacy ilike (seq scan)', legacy_search_artists, terms)
+    try:
+        db.session.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        db.session.execute('CREATE INDEX "ix_Artist_name_trgm" ON "Artist" USING gin (name gin_trgm_ops)')
+        db.session.execute('ANALYZE "Artist"')
+        db.session.commit()
+        percentiles('database (pg_trgm index)', DatabaseSearch(db, Artist).search, terms)
+    except SQLAlchemyError:
+        db.session.rollback()
+        print('pg_trgm is not available on this server, skipping the indexed run')
+    memory_search = MemorySearch(db, Artist)
+    start = time.perf_counter()
+    memory_search.load()
+    print(f'memory index load            {(time.perf_counter() - start) * 1000:9.1f}ms')
+    percentiles('memory (trigram index)', memory_search.search, terms)
+
+
+def bench_artists():
+    seed_artist_names(1000000)
+    print('/artists at 1M artists')
+    measure('legacy (all ORM objects)', legacy_artists, runs=1)
+    measure('first page', lambda: artist_page(0, 100))
+    measure('page after 900k artists', lambda: artist_page(900000, 100))
+
+
+def bench_datetime():
+    # 10k rows drawn from 500 distinct show times, as on a large /shows page
+    now = datetime.now().replace(microsecond=0)
+    times = [now + timedelta(hours=random.randint(0, 500)) for _ in range(10000)]
+    strings = [str(value) for value in times]
+    print('datetime filter over 10k show rows')
+    for label, fn, values in (
+            ('legacy (parse + babel)', legacy_format_datetime, strings),
+            ('cached, from strings', format_datetime, strings),
+            ('cached, from datetimes', format_datetime, times)):
+        format_datetime.cache_clear()
+        start = time.perf_counter()
+        for value in values:
+            fn(value)
+        print(f'{label:<28} total={(time.perf_counter() - start) * 1000:9.1f}ms')
+    format_datetime.cache_clear()
+    start = time.perf_counter()
+    for value in set(times):
+        format_datetime(value)
+    print(f'{"uncached, from datetimes":<28} per call='
+          f'{(time.perf_counter() - start) * 1e6 / len(set(times)):7.1f}us')
+
+
+def write_venue_csv(path, num_venues):
+    fields = ['name', 'genres', 'address', 'city', 'state', 'phone', 'website',
+              'facebook_link', 'image_link', 'seeking_talent', 'seeking_description']
+    with open(path, 'w', newline='') as target:
+        writer = csv.DictWriter(target, fields)
+        writer.writeheader()
+        for i in range(num_venues):
+            writer.writerow({
+                'name': f'Festival Stage {i}', 'genres': 'Jazz,Folk', 'address': f'{i} Main St',
+                'city': 'Austin', 'state': 'TX', 'phone': '512-555-0100',
+                'website': 'https://example.com', 'facebook_link': 'https://facebook.com/stage',
+                'image_link': 'https://example.com/stage.jpg', 'seeking_talent': 'y',
+                'seeking_description': 'Looking for bands',
+            })
+
+
+def legacy_import(path):
+    # one add and one commit per record, as the create forms do
+    with open(path, newline='') as source:
+        for record in csv.DictReader(source):
+            record['genres'] = record['genres'].split(',')
+            record['seeking_talent'] = record['seeking_talent'] == 'y'
+            db.session.add(Venue(**record))
+            db.session.commit()
+
+
+def bench_import():
+    seeded_path = os.path.join(tempfile.mkdtemp(), 'venues.csv')
+    print('venue import throughput')
+    for label, num_venues, run in (
+            ('legacy (commit per row)', 2000, legacy_import),
+            ('import, batch 1000', 100000, lambda path: import_records('venues', path, 1000)),
+            ('import, batch 10000', 100000, lambda path: import_records('venues', path, 10000))):
+        global seeded
+        seeded = None
+        db.drop_all()
+        db.create_all()
+        write_venue_csv(seeded_path, num_venues)
+        start = time.perf_counter()
+        run(seeded_path)
+        seconds = time.perf_counter() - start
+        print(f'{label:<28} rows={num_venues:<8} {num_venues / seconds:9.0f} rows/s')
+
+
+BENCHMARKS = {
+    'venues': bench_venues,
+    'shows': bench_shows,
+    'detail': bench_detail,
+    'search': bench_search,
+    'artists': bench_artists,
+    'datetime': bench_datetime,
+    'import': bench_import,
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    with app.app_context():
+        for name in names:
+            BENCHMARKS[name]()
@@ -0,0 +1,85 @@
+#----------------------------------------------------------------------------#
+# Connection pool with usage metrics.
+#
+# InstrumentedQueuePool is a regular QueuePool that also times how long a
+# checkout waits for a connection (queueing or opening a new one).
+# pool_stats() summarizes checkouts, wait time, overflow and connection age.
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+class PoolStats(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.age_max = 0.0
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_checkout(self, age):
+        with self.lock:
+            self.checkouts += 1
+            self.age_max = max(self.age_max, age)
+
+    def record_connect(self):
+        with self.lock:
+            self.connects += 1
+
+
+class InstrumentedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super(InstrumentedQueuePool, self).__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        if kwargs.get('_dispatch') is None:
+            event.listen(self, 'connect', self.on_connect)
+            event.listen(self, 'checkout', self.on_checkout)
+        # else recreate() copied the listeners of the old pool, which count
+        # into the stats this pool takes over, listening again counts twice
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super(InstrumentedQueuePool, self)._do_get()
+        finally:
+            self.stats.record_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool, keep counting into the same stats
+        pool = super(InstrumentedQueuePool, self).recreate()
+        pool.stats = self.stats
+        return pool
+
+    def on_connect(self, dbapi_connection, connection_record):
+        connection_record.info['connected_at'] = time.time()
+        self.stats.record_connect()
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.stats.record_checkout(time.time() - connection_record.info.get('connected_at', time.time()))
+
+
+def pool_stats(pool):
+    stats = pool.stats
+    with stats.lock:
+        return {
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'checkouts': stats.checkouts,
+            'connects': stats.connects,
+            'wait_total_ms': round(stats.wait_total * 1000, 3),
+            'wait_avg_ms': round(stats.wait_total * 1000 / stats.checkouts, 3) if stats.checkouts else 0.0,
+            'wait_max_ms': round(stats.wait_max * 1000, 3),
+            'connection_age_max_s': round(stats.age_max, 1),
+        }
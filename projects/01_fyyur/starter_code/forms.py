@@ -1,5 +1,5 @@
 from datetime import datetime
-from flask_wtf import Form
+from flask_wtf import FlaskForm as Form
 from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, ValidationError
 from wtforms.validators import DataRequired, AnyOf, URL, Length
 import re
@@ -179,10 +179,10 @@ class ArtistForm(Form):
 
 class ShowForm(Form):
     artist_id = StringField(
-        'artist_id', validators=[URL()]
+        'artist_id', validators=[DataRequired()]
     )
     venue_id = StringField(
-        'venue_id', validators=[URL()]
+        'venue_id', validators=[DataRequired()]
     )
     start_time = DateTimeField(
         'start_time',
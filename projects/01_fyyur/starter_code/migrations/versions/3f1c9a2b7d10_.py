@@ -0,0 +1,30 @@
+"""trigram indexes for venue and artist name search
+
+Revision ID: 3f1c9a2b7d10
+Revises: 6d3ddba7048d
+Create Date: 2026-10-17 10:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a2b7d10'
+down_revision = '6d3ddba7048d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # gin_trgm_ops lets postgres answer name ILIKE '%term%' from the index
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_Venue_name_trgm', 'Venue', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Artist_name_trgm', 'Artist', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
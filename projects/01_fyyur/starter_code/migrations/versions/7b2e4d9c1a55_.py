@@ -0,0 +1,29 @@
+"""indexes for show lookups by venue, artist and start time
+
+Revision ID: 7b2e4d9c1a55
+Revises: 3f1c9a2b7d10
+Create Date: 2026-10-17 11:02:44.581930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2e4d9c1a55'
+down_revision = '3f1c9a2b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+    # start_time leads, the ids make it match the /shows keyset ordering
+    op.create_index('ix_Show_start_time', 'Show', ['start_time', 'venue_id', 'artist_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_start_time', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
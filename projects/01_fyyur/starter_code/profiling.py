@@ -0,0 +1,112 @@
+#----------------------------------------------------------------------------#
+# Per-request SQL profiling.
+#
+# When PROFILE_SQL is enabled every request records its query count, total
+# database time, slowest statement and template render time. Profiles are
+# logged to the app logger and kept per route for /_debug/profile.
+# SQL_QUERY_BUDGETS maps routes to the most queries they may issue; with
+# SQL_QUERY_BUDGET_STRICT an overrun raises QueryBudgetExceeded, which makes
+# a test client request fail.
+#----------------------------------------------------------------------------#
+
+import json
+import threading
+import time
+
+from flask import g, has_request_context, request, jsonify, abort
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class ProfiledTemplate(Template):
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super(ProfiledTemplate, self).render(*args, **kwargs)
+        finally:
+            profile = current_profile()
+            if profile is not None:
+                profile['render_ms'] += (time.perf_counter() - start) * 1000
+
+
+def current_profile():
+    if has_request_context():
+        return g.get('sql_profile')
+    return None
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile() is not None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile()
+    if profile is None or not conn.info.get('query_start'):
+        return
+    elapsed = (time.perf_counter() - conn.info['query_start'].pop()) * 1000
+    profile['queries'] += 1
+    profile['db_ms'] += elapsed
+    if elapsed >= profile['slowest_ms']:
+        profile['slowest_ms'] = elapsed
+        profile['slowest_statement'] = statement
+
+
+def init_profiling(app):
+    # routes -> their latest profile and the most queries seen so far
+    route_profiles = {}
+    lock = threading.Lock()
+    app.jinja_env.template_class = ProfiledTemplate
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def start_profile():
+        if app.config['PROFILE_SQL']:
+            g.sql_profile = {
+                'queries': 0,
+                'db_ms': 0.0,
+                'slowest_ms': 0.0,
+                'slowest_statement': None,
+                'render_ms': 0.0,
+                'started': time.perf_counter(),
+            }
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else request.path
+        profile['route'] = route
+        profile['total_ms'] = (time.perf_counter() - profile.pop('started')) * 1000
+        for key in ('db_ms', 'slowest_ms', 'render_ms', 'total_ms'):
+            profile[key] = round(profile[key], 3)
+        with lock:
+            stats = route_profiles.setdefault(route, {'requests': 0, 'max_queries': 0})
+            stats['requests'] += 1
+            stats['max_queries'] = max(stats['max_queries'], profile['queries'])
+            stats['last'] = profile
+        app.logger.info('sql profile %s', json.dumps(profile))
+        budget = app.config['SQL_QUERY_BUDGETS'].get(route)
+        if budget is not None and profile['queries'] > budget:
+            message = f'{request.method} {route} issued {profile["queries"]} queries, budget is {budget}'
+            app.logger.warning(message)
+            if app.config['SQL_QUERY_BUDGET_STRICT']:
+                raise QueryBudgetExceeded(message)
+        return response
+
+    @app.route('/_debug/profile')
+    def debug_profile():
+        # profiles per route, only served in debug mode
+        if not app.debug:
+            abort(404)
+        with lock:
+            return jsonify(route_profiles)
+
+    return route_profiles
@@ -0,0 +1,103 @@
+#----------------------------------------------------------------------------#
+# Name search for venues and artists.
+#
+# DatabaseSearch runs a case-insensitive substring match in postgres, which is
+# served by the pg_trgm GIN indexes of migration 3f1c9a2b7d10.
+# MemorySearch keeps an equivalent trigram index in process, for databases
+# without pg_trgm (sqlite, tests).
+#----------------------------------------------------------------------------#
+
+from collections import defaultdict
+
+
+def escape_like(term):
+    # make % and _ in the user's search term match literally
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class DatabaseSearch(object):
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+
+    def search(self, term):
+        # returns [(id, name)] ordered by id
+        pattern = '%' + escape_like(term) + '%'
+        return self.db.session.query(self.model.id, self.model.name).filter(
+            self.model.name.ilike(pattern, escape='\\')
+        ).order_by(self.model.id).all()
+
+    def add(self, item_id, name):
+        pass
+
+    def remove(self, item_id):
+        pass
+
+    def reset(self):
+        pass
+
+
+class MemorySearch(object):
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+        self.names = None
+        self.lowered = {}
+        self.postings = defaultdict(set)
+
+    def load(self):
+        self.names = {}
+        self.lowered = {}
+        self.postings = defaultdict(set)
+        for item_id, name in self.db.session.query(self.model.id, self.model.name):
+            self.add(item_id, name)
+
+    def add(self, item_id, name):
+        if self.names is None:
+            # not loaded yet, the row will be picked up by load()
+            return
+        self.remove(item_id)
+        self.names[item_id] = name
+        self.lowered[item_id] = (name or '').lower()
+        for gram in trigrams(self.lowered[item_id]):
+            self.postings[gram].add(item_id)
+
+    def remove(self, item_id):
+        if self.names is None or item_id not in self.names:
+            return
+        del self.names[item_id]
+        for gram in trigrams(self.lowered.pop(item_id)):
+            self.postings[gram].discard(item_id)
+
+    def reset(self):
+        # forget the index, it is rebuilt from the database on the next search
+        self.names = None
+
+    def search(self, term):
+        if self.names is None:
+            self.load()
+        term = term.lower()
+        grams = trigrams(term)
+        if grams:
+            # the candidates share every trigram of the term, the substring
+            # check below removes the ones where they are not contiguous
+            candidates = set.intersection(*[self.postings.get(gram, set()) for gram in grams])
+        else:
+            candidates = self.lowered.keys()
+        return sorted(
+            (item_id, self.names[item_id]) for item_id in candidates if term in self.lowered[item_id]
+        )
+
+
+SEARCH_BACKENDS = {
+    'database': DatabaseSearch,
+    'memory': MemorySearch,
+}
+
+
+def make_search(backend, db, model):
+    return SEARCH_BACKENDS[backend](db, model)
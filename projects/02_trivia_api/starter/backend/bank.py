@@ -0,0 +1,262 @@
+import csv
+import json
+import os
+import time
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy.exc import DataError, IntegrityError
+
+from models import db, Question, Category
+
+'''
+Question bank import and export.
+
+    flask trivia import questions.jsonl [--batch-size 5000] [--resume]
+    flask trivia export questions.csv
+
+A question bank is a .jsonl file with one question per line or a .csv
+file with a header row. Every question has the fields question, answer,
+difficulty and category, where category is the type of a category
+("Science") or its id. Export writes the same fields plus id.
+
+Imports are streamed and inserted in batches, one transaction per batch.
+Categories are resolved in memory and new ones are created in the batch
+of their first question. After every committed batch the number of
+records done is written to <file>.checkpoint, and --resume skips that
+many records, so a failed import of a large bank continues where it
+stopped instead of inserting the committed batches again.
+
+The import runs in its own process, so restart a running API afterwards,
+its in-process caches do not see the imported questions.
+'''
+
+FIELDS = ['id', 'question', 'answer', 'difficulty', 'category']
+# print progress every this many records
+PROGRESS_EVERY = 100000
+
+trivia_cli = AppGroup('trivia', help='Import and export question banks.')
+
+
+def read_records(path):
+    # yields one dict per record, csv and jsonl are both streamed
+    with open(path, newline='', encoding='utf-8') as source:
+        if path.endswith('.csv'):
+            for record in csv.DictReader(source):
+                yield record
+        else:
+            for line in source:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # rejected as 'not an object'
+                        yield None
+
+
+def checkpoint_path(path):
+    return path + '.checkpoint'
+
+
+def read_checkpoint(path):
+    try:
+        with open(checkpoint_path(path)) as checkpoint:
+            return int(checkpoint.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, done):
+    # written next to the file and renamed, a crash never leaves half of it
+    with open(checkpoint_path(path) + '.tmp', 'w') as checkpoint:
+        checkpoint.write(str(done))
+    os.replace(checkpoint_path(path) + '.tmp', checkpoint_path(path))
+
+
+class CategoryResolver:
+    '''
+    maps the category of a record to the id stored in Question.category,
+    creating categories that do not exist yet in the current transaction
+    '''
+
+    def __init__(self):
+        self.ids = set()
+        self.by_type = {}
+        for category_id, category_type in db.session.query(
+                Category.id, Category.type):
+            self.ids.add(category_id)
+            self.by_type[(category_type or '').lower()] = category_id
+        self.created = 0
+
+    def resolve(self, category):
+        category = str(category if category is not None else '').strip()
+        if not category:
+            return None
+        if category.isdigit():
+            return category if int(category) in self.ids else None
+        category_id = self.by_type.get(category.lower())
+        if category_id is None:
+            new_category = Category(type=category)
+            db.session.add(new_category)
+            db.session.flush()
+            category_id = new_category.id
+            self.ids.add(category_id)
+            self.by_type[category.lower()] = category_id
+            self.created += 1
+        return str(category_id)
+
+    def forget(self, category_ids):
+        # categories of a batch that was rolled back
+        for category_type, category_id in list(self.by_type.items()):
+            if category_id in category_ids:
+                del self.by_type[category_type]
+                self.ids.discard(category_id)
+
+
+def record_to_row(record, categories):
+    # returns (row, error) where row is ready to be inserted
+    if not isinstance(record, dict):
+        return None, 'not an object'
+    question = str(record.get('question') or '').strip()
+    answer = str(record.get('answer') or '').strip()
+    if not question or not answer:
+        return None, 'question and answer are required'
+    try:
+        difficulty = int(record.get('difficulty'))
+    except (TypeError, ValueError):
+        return None, 'difficulty must be an integer'
+    category = categories.resolve(record.get('category'))
+    if category is None:
+        return None, f'unknown category {record.get("category")!r}'
+    return {
+        'question': question,
+        'answer': answer,
+        'difficulty': difficulty,
+        'category': category,
+    }, None
+
+
+def import_questions(path, batch_size=5000, resume=False, echo=print):
+    '''
+    inserts the questions of a bank, returns (inserted, rejected, skipped)
+    '''
+    skip = read_checkpoint(path) if resume else 0
+    categories = CategoryResolver()
+    inserted = rejected = done = 0
+    batch = []
+    batch_categories = set(categories.ids)
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal batch_categories
+        try:
+            if batch:
+                db.session.execute(Question.__table__.insert(), batch)
+            db.session.commit()
+            count = len(batch)
+        except (DataError, IntegrityError) as error:
+            # bad rows reject their batch, other errors (a lost connection)
+            # stop the import before the checkpoint moves past the batch
+            db.session.rollback()
+            categories.forget(categories.ids - batch_categories)
+            echo(f'records up to {done}: {len(batch)} rows rejected: '
+                 f'{error.__class__.__name__}: '
+                 f'{str(getattr(error, "orig", error)).strip()}')
+            count = 0
+        write_checkpoint(path, done)
+        batch_categories = set(categories.ids)
+        return count
+
+    for done, record in enumerate(read_records(path), start=1):
+        if done <= skip:
+            continue
+        row, error = record_to_row(record, categories)
+        if error:
+            rejected += 1
+            echo(f'record {done}: {error}')
+        else:
+            batch.append(row)
+        if len(batch) >= batch_size:
+            count = flush()
+            inserted += count
+            rejected += len(batch) - count
+            batch = []
+        if done % PROGRESS_EVERY == 0:
+            seconds = time.perf_counter() - start
+            echo(f'{done} records, {inserted} inserted, '
+                 f'{inserted / seconds:.0f} rows/s')
+    count = flush()
+    inserted += count
+    rejected += len(batch) - count
+    os.remove(checkpoint_path(path))
+    db.session.close()
+    # the question counts and ids, the category cache and the ETag
+    # versions live in the API process, which does not see these rows:
+    # restart it after an import
+    return inserted, rejected, min(skip, done)
+
+
+def export_rows(batch_size=5000):
+    # yields the questions in id order with their category type
+    types = dict(db.session.query(Category.id, Category.type))
+    query = db.session.query(
+        Question.id, Question.question, Question.answer,
+        Question.difficulty, Question.category
+    ).order_by(Question.id).yield_per(batch_size)
+    for question_id, question, answer, difficulty, category in query:
+        try:
+            category = types.get(int(category), category)
+        except (TypeError, ValueError):
+            pass
+        yield {
+            'id': question_id,
+            'question': question,
+            'answer': answer,
+            'difficulty': difficulty,
+            'category': category,
+        }
+
+
+def export_questions(path):
+    # writes every question to a .jsonl or .csv file, returns the count
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as target:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(target, fieldnames=FIELDS)
+            writer.writeheader()
+            for count, row in enumerate(export_rows(), start=1):
+                writer.writerow(row)
+        else:
+            for count, row in enumerate(export_rows(), start=1):
+                target.write(json.dumps(row) + '\n')
+    return count
+
+
+@trivia_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Rows per insert and commit.')
+@click.option('--resume', is_flag=True,
+              help='Skip the records committed by an earlier run.')
+def import_command(path, batch_size, resume):
+    """Import questions from a .jsonl or .csv file.
+
+    Restart a running API afterwards, its caches do not see the imported
+    questions.
+    """
+    start = time.perf_counter()
+    inserted, rejected, skipped = import_questions(
+        path, batch_size, resume, echo=click.echo)
+    seconds = max(time.perf_counter() - start, 1e-6)
+    click.echo(f'{inserted} questions imported, {rejected} rejected, '
+               f'{skipped} skipped, {inserted / seconds:.0f} rows/s')
+
+
+@trivia_cli.command('export')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+def export_command(path):
+    """Export every question to a .jsonl or .csv file."""
+    start = time.perf_counter()
+    count = export_questions(path)
+    seconds = max(time.perf_counter() - start, 1e-6)
+    click.echo(f'{count} questions exported, {count / seconds:.0f} rows/s')
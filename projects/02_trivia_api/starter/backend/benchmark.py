@@ -0,0 +1,332 @@
+'''
+Benchmarks for the trivia API.
+
+Point DATABASE_URL at a scratch postgres database before running,
+the seed step drops and recreates every table:
+
+    export DATABASE_URL=postgresql://localhost:5432/trivia_bench
+    python benchmark.py pagination
+'''
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import flask
+
+from flaskr import create_app, encode_cursor
+from models import db, Question, Category, category_cache
+from search import DatabaseSearch, MemorySearch
+from bank import import_questions, export_questions
+import fastjson
+
+RUNS = 20
+# size of the dataset currently in the scratch database
+seeded = None
+
+
+def measure(label, fn, runs=RUNS):
+    '''
+    prints the median and max latency of fn over a number of runs
+    '''
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f'{label:<32} median={timings[len(timings) // 2] * 1000:8.2f}ms '
+          f'max={timings[-1] * 1000:8.2f}ms')
+
+
+def seed(num_questions, chunk=50000):
+    '''
+    six categories and num_questions questions spread over them
+    '''
+    global seeded
+    if seeded == num_questions:
+        return
+    seeded = num_questions
+    # end the open transaction, it would block dropping the tables
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    db.session.bulk_insert_mappings(Category, [
+        {'id': i + 1, 'type': name} for i, name in enumerate(
+            ['Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports'])])
+    for offset in range(0, num_questions, chunk):
+        db.session.bulk_insert_mappings(Question, [{
+            'id': i,
+            'question': f'Question number {i} about topic {random.randint(1, 5000)}?',
+            'answer': f'Answer {i}',
+            'category': str(i % 6 + 1),
+            'difficulty': random.randint(1, 5),
+        } for i in range(offset + 1, min(offset + chunk, num_questions) + 1)])
+        db.session.commit()
+    # the rows were inserted with explicit ids, move the id sequences on
+    for table in ('questions', 'categories'):
+        db.session.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"(SELECT max(id) FROM {table}))")
+    db.session.execute('ANALYZE')
+    db.session.commit()
+    Question.clear_caches()
+    Category.changed()
+
+
+def bench_pagination(app):
+    seed(200000)
+    client = app.test_client()
+    print('GET /questions at 200k questions')
+    for page in (1, 1000, 10000):
+        measure(f'legacy paginate page={page}', lambda: list(map(
+            Question.format, Question.query.paginate(page, 10, False).items)))
+        measure(f'?page={page}', lambda: client.get(f'/questions?page={page}'))
+        last_id = (page - 1) * 10
+        cursor = encode_cursor(last_id) if last_id else ''
+        measure(f'?cursor= (page {page})', lambda: client.get(f'/questions?cursor={cursor}'))
+
+
+def bench_categories(app):
+    seed(200000)
+    client = app.test_client()
+    print('GET /categories')
+    measure('legacy Category.query.all()', lambda: list(map(
+        Category.format, Category.query.all())), runs=200)
+    measure('cache', category_cache.json, runs=200)
+    measure('GET /categories', lambda: client.get('/categories'), runs=200)
+    print('category cache', category_cache.stats())
+
+
+def bench_quiz(app):
+    seed(200000)
+    client = app.test_client()
+    print('POST /quizzes at 200k questions (~33k per category)')
+    for played in (0, 50, 1000):
+        previous = random.sample(range(1, 200001), played)
+
+        def legacy():
+            candidates = Question.query.filter_by(category='1').filter(
+                Question.id.notin_(previous)).all()
+            return Question.format(candidates[random.randrange(len(candidates))])
+        measure(f'legacy notin_ previous={played}', legacy)
+        for category_id in (1, 0):
+            body = {'previous_questions': previous,
+                    'quiz_category': {'type': 'Science', 'id': category_id}}
+            measure(f'id index category={category_id} previous={played}',
+                    lambda: client.post('/quizzes', json=body))
+
+
+def play_quizzes(app, label, players, threads, rounds, start, play):
+    '''
+    all players start a quiz with start(client), then every round each
+    of them requests a question with play(client, player) on a pool of
+    threads, so every quiz is in progress at the same time. prints the
+    request latencies and the overall throughput
+    '''
+    timings = []
+    client = app.test_client()
+
+    def timed(fn, *args):
+        begin = time.perf_counter()
+        result = fn(client, *args)
+        timings.append(time.perf_counter() - begin)
+        return result
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        states = list(pool.map(lambda _: timed(start), range(players)))
+        for _ in range(rounds):
+            list(pool.map(lambda state: timed(play, state), states))
+    elapsed = time.perf_counter() - begin
+    timings.sort()
+    print(f'{label:<32} {len(timings) / elapsed:8.0f} req/s '
+          f'p50={timings[len(timings) // 2] * 1000:6.2f}ms '
+          f'p99={timings[int(len(timings) * 0.99)] * 1000:6.2f}ms')
+
+
+def bench_sessions(app, players=5000, threads=16, rounds=5):
+    '''
+    load test: players play a quiz of rounds questions concurrently
+    '''
+    seed(200000)
+    category = {'type': 'Science', 'id': 1}
+    # load the id index before the players arrive
+    Question.ids('1')
+    print(f'{players} concurrent quiz players, {rounds} rounds each, '
+          f'{threads} request threads')
+
+    def play_previous_questions(client, previous):
+        res = client.post('/quizzes', json={
+            'previous_questions': previous, 'quiz_category': category})
+        previous.append(res.get_json()['question']['id'])
+
+    def start_session(client):
+        res = client.post('/quizzes/sessions', json={'quiz_category': category})
+        return '/quizzes/sessions/' + res.get_json()['session_id'] + '/next'
+
+    def play_session(client, url):
+        assert client.post(url).get_json()['question']
+
+    play_quizzes(app, '/quizzes previous_questions', players, threads, rounds,
+                 lambda client: [], play_previous_questions)
+    play_quizzes(app, '/quizzes/sessions', players, threads, rounds,
+                 start_session, play_session)
+    store = app.extensions['quiz_sessions'].store
+    print(f'sessions held {len(store)}, evicted {store.evictions}')
+
+
+def bench_search(app, num_questions=1000000):
+    seed(num_questions)
+    client = app.test_client()
+    print(f'POST /searchQuestions at {num_questions} questions')
+    database = DatabaseSearch()
+    match, _ = database.query('topic 4242')
+    statement = db.session.query(Question.id).filter(match).statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    plan = [row[0] for row in db.session.execute('EXPLAIN ' + str(statement))]
+    print('uses ix_questions_search:',
+          any('ix_questions_search' in line for line in plan))
+    for term in ('topic 4242', 'answer 99999', 'number 123456'):
+        measure(f'legacy like {term!r}', lambda: list(map(
+            Question.format, Question.query.filter(
+                Question.question.like('%' + term + '%')
+            ).paginate(1, 10, False).items)))
+        measure(f'full text {term!r}', lambda: database.search(term, limit=11))
+        page = client.post('/searchQuestions', json={'searchTerm': term})
+        cursor = page.get_json()['next_cursor']
+        if cursor:
+            measure(f'full text next page {term!r}', lambda: client.post(
+                '/searchQuestions?cursor=' + cursor, json={'searchTerm': term}))
+    # the in-process index is meant for tests, build it over a smaller set
+    seed(100000)
+    memory = MemorySearch()
+    start = time.perf_counter()
+    memory.load()
+    print(f'memory index load {time.perf_counter() - start:.1f}s')
+    for term in ('topic 4242', 'answer 99999'):
+        measure(f'memory {term!r}', lambda: memory.search(term, limit=11))
+
+
+def bench_bank(app, num_questions=1000000):
+    seed(1000)
+    print(f'question bank import/export of {num_questions} questions')
+    start = time.perf_counter()
+    for i in range(2000):
+        Question(question=f'Legacy {i}?', answer='Yes', difficulty=1,
+                 category='1').insert()
+    print(f'{"legacy Question.insert":<32} '
+          f'{2000 / (time.perf_counter() - start):8.0f} rows/s')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bank.jsonl')
+        with open(path, 'w') as bank:
+            for i in range(num_questions):
+                bank.write(json.dumps({
+                    'question': f'Imported question {i}?',
+                    'answer': f'Answer {i}',
+                    'difficulty': random.randint(1, 5),
+                    'category': random.choice(
+                        ['Science', 'Art', 'Geography', 'History', 'Trivia']),
+                }) + '\n')
+        for batch_size in (1000, 5000):
+            start = time.perf_counter()
+            inserted, _, _ = import_questions(path, batch_size, echo=lambda line: None)
+            print(f'{"import batch-size=" + str(batch_size):<32} '
+                  f'{inserted / (time.perf_counter() - start):8.0f} rows/s')
+        for name in ('bank.jsonl', 'bank.csv'):
+            start = time.perf_counter()
+            count = export_questions(os.path.join(directory, name))
+            print(f'{"export " + name:<32} '
+                  f'{count / (time.perf_counter() - start):8.0f} rows/s')
+    # the tables no longer hold a seed() dataset
+    global seeded
+    seeded = None
+
+
+def bench_batch(app, size=500):
+    seed(200000)
+    client = app.test_client()
+    print(f'creating and deleting {size} questions')
+    questions = [{'question': f'Batch {i}?', 'answer': 'Yes',
+                  'difficulty': 1, 'category': 1} for i in range(size)]
+    start = time.perf_counter()
+    for question in questions:
+        client.post('/questions', json=question)
+    print(f'{"one POST /questions each":<32} '
+          f'{(time.perf_counter() - start) * 1000:8.0f}ms')
+    ids = [question_id for question_id, in db.session.query(Question.id).filter(
+        Question.question.like('Batch %'))]
+    start = time.perf_counter()
+    for question_id in ids:
+        client.delete(f'/questions/{question_id}')
+    print(f'{"one DELETE /questions/<id> each":<32} '
+          f'{(time.perf_counter() - start) * 1000:8.0f}ms')
+    start = time.perf_counter()
+    res = client.post('/questions/batch', json={'questions': questions})
+    print(f'{"POST /questions/batch":<32} '
+          f'{(time.perf_counter() - start) * 1000:8.0f}ms')
+    ids = [item['id'] for item in res.get_json()['results']]
+    start = time.perf_counter()
+    client.delete('/questions/batch', json={'ids': ids})
+    print(f'{"DELETE /questions/batch":<32} '
+          f'{(time.perf_counter() - start) * 1000:8.0f}ms')
+
+
+def bench_serialize(app, size=1000):
+    seed(200000)
+    print(f'serializing a page of {size} questions')
+    with app.test_request_context():
+        measure('ORM objects + flask.jsonify', lambda: flask.jsonify({
+            'questions': list(map(Question.format, Question.query.order_by(
+                Question.id).limit(size).all()))}))
+        rows = Question.rows().order_by(Question.id).limit(size).all()
+        questions = list(map(Question.format_row, rows))
+        measure('  query + hydrate only', lambda: Question.query.order_by(
+            Question.id).limit(size).all())
+        measure('  flask.jsonify only', lambda: flask.jsonify(
+            {'questions': questions}))
+        orjson = fastjson.orjson
+        for name, module in (('orjson', orjson), ('stdlib', None)):
+            fastjson.orjson = module
+            measure(f'column rows + fastjson ({name})', lambda: fastjson.jsonify({
+                'questions': list(map(Question.format_row, Question.rows(
+                ).order_by(Question.id).limit(size)))}))
+            measure(f'  fastjson only ({name})', lambda: fastjson.jsonify(
+                {'questions': questions}))
+        fastjson.orjson = orjson
+        measure('  column query only', lambda: Question.rows().order_by(
+            Question.id).limit(size).all())
+
+
+def bench_etag(app):
+    seed(200000)
+    client = app.test_client()
+    print('conditional GET at 200k questions')
+    for path in ('/categories', '/questions?page=1', '/categories/1/questions?page=100'):
+        etag = client.get(path).headers['ETag']
+        measure(f'GET {path}', lambda: client.get(path), runs=200)
+        measure(f'  If-None-Match (304)', lambda: client.get(
+            path, headers={'If-None-Match': etag}), runs=200)
+
+
+BENCHMARKS = {
+    'pagination': bench_pagination,
+    'categories': bench_categories,
+    'quiz': bench_quiz,
+    'sessions': bench_sessions,
+    'search': bench_search,
+    'bank': bench_bank,
+    'batch': bench_batch,
+    'serialize': bench_serialize,
+    'etag': bench_etag,
+}
+
+
+if __name__ == '__main__':
+    app = create_app()
+    names = sys.argv[1:] or list(BENCHMARKS)
+    with app.app_context():
+        for name in names:
+            BENCHMARKS[name](app)
@@ -0,0 +1,58 @@
+import json
+import threading
+
+'''
+CategoryCache
+    keeps the categories table in process, categories almost never change.
+    the list is loaded on first use and kept both as dicts and as a
+    pre-serialized JSON fragment that responses embed as is.
+    invalidate() drops it, the next lookup reloads from the database.
+'''
+
+
+class CategoryCache:
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+        # (categories, by_id, fragment), replaced as a whole
+        self.snapshot = None
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        # returns the snapshot, lookups use it instead of reading the
+        # attribute again, which invalidate() may have reset meanwhile
+        with self.lock:
+            if self.snapshot is not None:
+                self.hits += 1
+                return self.snapshot
+            self.misses += 1
+            rows = self.model.query.order_by(self.model.id).all()
+            categories = [row.format() for row in rows]
+            by_id = {category['id']: category for category in categories}
+            self.snapshot = (categories, by_id, json.dumps(categories))
+            return self.snapshot
+
+    def all(self):
+        categories, by_id, fragment = self.load()
+        return categories
+
+    def get(self, category_id):
+        categories, by_id, fragment = self.load()
+        return by_id.get(category_id)
+
+    def json(self):
+        categories, by_id, fragment = self.load()
+        return fragment
+
+    def invalidate(self):
+        with self.lock:
+            self.snapshot = None
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'loaded': self.snapshot is not None
+        }
@@ -0,0 +1,39 @@
+import json
+
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+'''
+JSON responses.
+
+jsonify() is a drop-in for flask.jsonify that serializes with orjson when
+it is installed (pip install orjson) and falls back to the standard
+library otherwise. Flask 1.x has no JSON provider to register, so the
+app imports jsonify from here instead of from flask.
+'''
+
+
+def dumps(data):
+    # compact JSON as bytes
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def response(body, status=200):
+    return current_app.response_class(
+        body + b'\n', status=status, mimetype='application/json')
+
+
+def jsonify(*args, **kwargs):
+    if args and kwargs:
+        raise TypeError('jsonify() takes either args or kwargs, not both')
+    if len(args) == 1:
+        data = args[0]
+    else:
+        data = list(args) or kwargs
+    return response(dumps(data))
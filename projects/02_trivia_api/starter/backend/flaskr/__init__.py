@@ -1,19 +1,160 @@
 import os
-from flask import Flask, request, abort, jsonify
+from flask import Flask, request, abort, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
 import json
+import base64
+import binascii
+import secrets
+from functools import wraps
+from sqlalchemy.exc import SQLAlchemyError
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category, category_cache, \
+    table_versions
+from quiz import random_unseen, QuizSessions, SESSION_STORES
+from search import make_search
+from bank import trivia_cli, CategoryResolver, record_to_row
+from fastjson import dumps, jsonify, response
 
 QUESTIONS_PER_PAGE = 10
+# most questions a batch request may create or delete
+MAX_BATCH_SIZE = 1000
+
+
+def encode_cursor(last_id, rank=None):
+    '''
+    opaque page token pointing after the question with id last_id,
+    search results also carry the rank of that question
+    '''
+    payload = {'after': last_id}
+    if rank is not None:
+        payload['rank'] = rank
+    payload = json.dumps(payload).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def cursor_payload(token):
+    try:
+        payload = base64.urlsafe_b64decode(token.encode('ascii'))
+        payload = json.loads(payload.decode('utf-8'))
+        return int(payload['after']), payload
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        abort(422)
+
+
+def decode_cursor(token):
+    '''
+    returns the question id a page token points after, aborts with 422
+    when the token was not produced by encode_cursor
+    '''
+    if not token:
+        return 0
+    return cursor_payload(token)[0]
+
+
+def decode_search_cursor(token):
+    '''
+    returns the (rank, id) of the search result a page token points
+    after, None for an empty token
+    '''
+    if not token:
+        return None
+    last_id, payload = cursor_payload(token)
+    if not isinstance(payload.get('rank'), (int, float)):
+        abort(422)
+    return payload['rank'], last_id
+
+
+def paginate_questions(query):
+    '''
+    one page of questions ordered by id, plus the token of the next page.
+    ?cursor=<token> seeks past the last question of the previous page
+    (an empty cursor starts at the beginning), ?page=<n> keeps the
+    page number interface
+    '''
+    query = query.order_by(Question.id)
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        query = query.filter(Question.id > decode_cursor(cursor))
+    else:
+        # pages before the first are the first page
+        page = max(request.args.get('page', 1, type=int), 1)
+        query = query.offset((page - 1) * QUESTIONS_PER_PAGE)
+    items = query.limit(QUESTIONS_PER_PAGE + 1).all()
+    next_cursor = None
+    if len(items) > QUESTIONS_PER_PAGE:
+        items = items[:QUESTIONS_PER_PAGE]
+        next_cursor = encode_cursor(items[-1].id)
+    return items, next_cursor
+
+
+def categories_response(result):
+    '''
+    jsonify(result) with the cached categories added under "categories",
+    the categories are embedded as their pre-serialized JSON fragment
+    '''
+    body = dumps(result)
+    return response(body[:-1] + b',"categories":' +
+                    category_cache.json().encode('utf-8') + b'}')
+
+
+# differs between processes, whose table versions are counted separately
+ETAG_PREFIX = secrets.token_hex(4)
+
+
+def conditional(*tables):
+    '''
+    decorator for GET endpoints whose responses only depend on the request
+    and the given tables. the ETag is made of the table versions, so an
+    If-None-Match that still matches is answered with 304 before the
+    endpoint runs, without a database query.
+    the versions only move on writes through the models of this process,
+    so run the API as a single process and restart it after a
+    `flask trivia import`, otherwise it answers 304 for changed tables
+    '''
+    def decorator(view):
+        @wraps(view)
+        def conditional_view(*args, **kwargs):
+            etag = '-'.join([ETAG_PREFIX] + [
+                str(table_versions[table]) for table in tables])
+            if request.if_none_match.contains(etag):
+                result = current_app.response_class(status=304)
+            else:
+                result = view(*args, **kwargs)
+                if result.status_code != 200:
+                    return result
+            result.set_etag(etag)
+            max_age = current_app.config['CACHE_MAX_AGE']
+            result.cache_control.public = True
+            result.cache_control.max_age = max_age
+            if not max_age:
+                result.cache_control.must_revalidate = True
+            return result
+        return conditional_view
+    return decorator
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
+    app.config['QUIZ_SESSION_BACKEND'] = os.environ.get(
+        'QUIZ_SESSION_BACKEND', 'memory')
+    app.config['QUIZ_SESSION_MAX'] = int(os.environ.get(
+        'QUIZ_SESSION_MAX', '10000'))
+    app.config['QUIZ_SESSION_TTL'] = int(os.environ.get(
+        'QUIZ_SESSION_TTL', '1800'))
+    app.config['SEARCH_BACKEND'] = os.environ.get('SEARCH_BACKEND', 'database')
+    # seconds browsers and proxies may reuse a response without asking
+    app.config['CACHE_MAX_AGE'] = int(os.environ.get('CACHE_MAX_AGE', '0'))
+    if test_config:
+        app.config.update(test_config)
     setup_db(app)
+    question_search = make_search(app.config['SEARCH_BACKEND'])
+    app.cli.add_command(trivia_cli)
+    quiz_sessions = QuizSessions(
+        SESSION_STORES[app.config['QUIZ_SESSION_BACKEND']](
+            app.config['QUIZ_SESSION_MAX'], app.config['QUIZ_SESSION_TTL']))
+    app.extensions['quiz_sessions'] = quiz_sessions
 
     '''
     Set up CORS. Allow '*' for origins.
@@ -34,13 +175,12 @@ def create_app(test_config=None):
     for all available categories.
     '''
     @app.route("/categories")
+    @conditional('categories')
     def get_categories():
-        categories = list(map(Category.format, Category.query.all()))
         result = {
             "success": True,
-            "categories": categories
         }
-        return jsonify(result)
+        return categories_response(result)
 
     '''
     Create an endpoint to handle GET requests for questions,
@@ -55,22 +195,20 @@ def create_app(test_config=None):
     Clicking on the page numbers should update the questions.
     '''
     @app.route("/questions")
+    @conditional('questions', 'categories')
     def get_questions():
-        page = int(request.args.get('page'))
-        categories = list(map(Category.format, Category.query.all()))
-        questions_query = Question.query.paginate(
-            page, QUESTIONS_PER_PAGE, False)
-        questions = list(map(Question.format, questions_query.items))
+        question_items, next_cursor = paginate_questions(Question.rows())
+        questions = list(map(Question.format_row, question_items))
         if not questions:
             abort(404)
         result = {
             "success": True,
             "questions": questions,
-            "total_questions": len(questions),
-            "categories": categories,
+            "total_questions": Question.count(),
             "current_category": None,
+            "next_cursor": next_cursor,
         }
-        return jsonify(result)
+        return categories_response(result)
 
     '''
     Create an endpoint to DELETE question using a question ID.
@@ -85,6 +223,7 @@ def create_app(test_config=None):
         if not question_data:
             abort(404)
         Question.delete(question_data)
+        question_search.remove(question_data.id)
         result = {
             "success": True,
         }
@@ -115,17 +254,111 @@ def create_app(test_config=None):
             difficulty=user_input['difficulty'],
             category=str(user_input['category'])
         )
+        category_duplicate = any(
+            category['type'] == str(user_input['category'])
+            for category in category_cache.all())
+        if not category_duplicate:
+            # committed together with the question
+            db.session.add(Category(type=str(user_input['category'])))
         Question.insert(new_question)
-        category_duplicate = Category.query.filter_by(
-            type=str(user_input['category'])).first()
         if not category_duplicate:
-            new_category = Category(type=str(user_input['category']))
-            Category.insert(new_category)
+            Category.changed()
+        question_search.add(new_question)
         result = {
             "success": True,
         }
         return jsonify(result)
 
+    '''
+    Batch endpoints create or delete a list of questions in one
+    transaction and report a result per item. Invalid items (or ids
+    that do not exist) fail on their own, the other items are applied.
+    '''
+    def batch_items(key):
+        if not request.data:
+            abort(422)
+        items = json.loads(request.data.decode('utf-8')).get(key)
+        if not isinstance(items, list) or len(items) > MAX_BATCH_SIZE:
+            abort(422)
+        return items
+
+    @app.route("/questions/batch", methods=['POST'])
+    def add_questions():
+        items = batch_items('questions')
+        categories = CategoryResolver()
+        results = []
+        rows = []
+        for index, item in enumerate(items):
+            row, error = record_to_row(item, categories)
+            if error:
+                results.append({"index": index, "success": False,
+                                "error": error})
+            else:
+                results.append({"index": index, "success": True})
+                rows.append(row)
+        table = Question.__table__
+        try:
+            if rows and db.engine.dialect.name == 'postgresql':
+                # one INSERT ... VALUES (...), (...) RETURNING id
+                ids = [row.id for row in db.session.execute(
+                    table.insert().values(rows).returning(table.c.id))]
+            else:
+                questions = [Question(**row) for row in rows]
+                db.session.add_all(questions)
+                db.session.flush()
+                ids = [question.id for question in questions]
+            db.session.commit()
+        except SQLAlchemyError:
+            # nothing of the batch was applied
+            db.session.rollback()
+            abort(422)
+        if rows:
+            Question.clear_caches(*{row['category'] for row in rows})
+        if categories.created:
+            Category.changed()
+        created = iter(zip(ids, rows))
+        for result in results:
+            if result["success"]:
+                question_id, row = next(created)
+                result["id"] = question_id
+                question = Question(**row)
+                question.id = question_id
+                question_search.add(question)
+        result = {
+            "success": True,
+            "created": len(ids),
+            "results": results,
+        }
+        return jsonify(result)
+
+    @app.route("/questions/batch", methods=['DELETE'])
+    def delete_questions():
+        items = batch_items('ids')
+        ids = [item for item in items if type(item) is int]
+        existing = dict(db.session.query(Question.id, Question.category)
+                        .filter(Question.id.in_(ids)))
+        if existing:
+            Question.query.filter(Question.id.in_(existing)).delete(
+                synchronize_session=False)
+            db.session.commit()
+            Question.clear_caches(*existing.values())
+        else:
+            db.session.commit()
+        results = []
+        for item in items:
+            if type(item) is int and item in existing:
+                question_search.remove(item)
+                results.append({"id": item, "success": True})
+            else:
+                results.append({"id": item, "success": False,
+                                "error": "not found"})
+        result = {
+            "success": True,
+            "deleted": len(existing),
+            "results": results,
+        }
+        return jsonify(result)
+
     '''
     Create a POST endpoint to get questions based on a search term.
     It should return any questions for whom the search term
@@ -134,25 +367,44 @@ def create_app(test_config=None):
     TEST: Search by any phrase. The questions list will update to include
     only question that include that string within their question.
     Try using the word "title" to start.
+
+    Every word of the search term has to start a word of the question or
+    its answer, ignoring case (see search.py). The best matches come
+    first; ?cursor=<next_cursor> or ?page=<n> selects the page.
     '''
     @app.route("/searchQuestions", methods=['POST'])
     def search_questions():
         if not request.data:
             abort(422)
         search_data = json.loads(request.data.decode('utf-8'))
-        page = int(request.args.get('page', '1'))
-        if 'searchTerm' in search_data:
-            questions_query = Question.query.filter(
-                Question.question.like('%'+search_data['searchTerm']+'%')
-            ).paginate(page, QUESTIONS_PER_PAGE, False)
-        questions = list(map(Question.format, questions_query.items))
+        if not isinstance(search_data.get('searchTerm'), str):
+            abort(422)
+        term = search_data['searchTerm']
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            hits = question_search.search(
+                term, after=decode_search_cursor(cursor),
+                limit=QUESTIONS_PER_PAGE + 1)
+        else:
+            # pages before the first are the first page
+            page = max(request.args.get('page', 1, type=int), 1)
+            hits = question_search.search(
+                term, offset=(page - 1) * QUESTIONS_PER_PAGE,
+                limit=QUESTIONS_PER_PAGE + 1)
+        next_cursor = None
+        if len(hits) > QUESTIONS_PER_PAGE:
+            hits = hits[:QUESTIONS_PER_PAGE]
+            rank, question = hits[-1]
+            next_cursor = encode_cursor(question.id, rank)
+        questions = [Question.format_row(row) for _, row in hits]
         if not questions:
             abort(404)
         result = {
             "success": True,
             "questions": questions,
-            "total_questions": len(questions),
+            "total_questions": question_search.count(term),
             "current_category": None,
+            "next_cursor": next_cursor,
         }
         return jsonify(result)
 
@@ -164,24 +416,22 @@ def create_app(test_config=None):
     category to be shown.
     '''
     @app.route("/categories/<int:category_id>/questions")
+    @conditional('questions', 'categories')
     def get_question_by_category(category_id):
-        page = int(request.args.get('page', '1'))
-        categories = list(map(Category.format, Category.query.all()))
-        current_category = Category.format(Category.query.get(category_id))
-        questions_query = Question.query.filter_by(
-            category=str(category_id)).paginate(
-            page, QUESTIONS_PER_PAGE, False)
-        questions = list(map(Question.format, questions_query.items))
+        current_category = category_cache.get(category_id)
+        question_items, next_cursor = paginate_questions(
+            Question.rows().filter(Question.category == str(category_id)))
+        questions = list(map(Question.format_row, question_items))
         if not questions:
             abort(404)
         result = {
             "success": True,
             "questions": questions,
-            "total_questions": questions_query.total,
-            "categories": categories,
+            "total_questions": Question.count(str(category_id)),
             "current_category": current_category,
+            "next_cursor": next_cursor,
         }
-        return jsonify(result)
+        return categories_response(result)
 
     '''
     Create a POST endpoint to get questions to play the quiz.
@@ -202,23 +452,85 @@ def create_app(test_config=None):
                 'id' not in search_data['quiz_category'] or
                 'previous_questions' not in search_data):
             abort(404)
-        questions_query = Question.query.filter_by(
-            category=str(search_data['quiz_category']['id'])
-        ).filter(
-            Question.id.notin_(search_data["previous_questions"])
-        ).all()
-        length_of_available_question = len(questions_query)
-        result = {"success": True, "question": None}
-        if length_of_available_question > 0:
-            result = {
-                "success": True,
-                "question": Question.format(
-                    questions_query[random.randrange(
-                        0, length_of_available_question)]
-                )
-            }
+        try:
+            category_id = int(search_data['quiz_category']['id'])
+            seen = set(map(int, search_data['previous_questions']))
+        except (TypeError, ValueError):
+            abort(422)
+        # id 0 is the "All" category of the frontend. unknown ids are
+        # answered before Question.ids, which keeps an index per id
+        if category_id and category_cache.get(category_id) is None:
+            abort(404)
+        category = str(category_id) if category_id else None
+        question = None
+        question_id = random_unseen(Question.ids(category), seen)
+        if question_id is not None:
+            question = Question.query.get(question_id)
+            if question is None:
+                # deleted by another process, reload the id index
+                Question.clear_caches(category)
+                question_id = random_unseen(Question.ids(category), seen)
+                if question_id is not None:
+                    question = Question.query.get(question_id)
+        result = {
+            "success": True,
+            "question": Question.format(question) if question else None
+        }
         return jsonify(result)
 
+    '''
+    Quiz sessions keep the questions that were not played yet on the
+    server. POST /quizzes/sessions starts a quiz for a category (id 0 for
+    all categories), POST /quizzes/sessions/<session_id>/next deals its
+    next question without resending previous_questions.
+    '''
+    @app.route("/quizzes/sessions", methods=['POST'])
+    def start_quiz_session():
+        if not request.data:
+            abort(422)
+        start_data = json.loads(request.data.decode('utf-8'))
+        if ('quiz_category' not in start_data or
+                'id' not in start_data['quiz_category']):
+            abort(404)
+        try:
+            category_id = int(start_data['quiz_category']['id'])
+        except (TypeError, ValueError):
+            abort(422)
+        if category_id and category_cache.get(category_id) is None:
+            abort(404)
+        category = str(category_id) if category_id else None
+        ids = Question.ids(category)
+        session_id, state = quiz_sessions.start(category, ids)
+        result = {
+            "success": True,
+            "session_id": session_id,
+            "total_questions": len(ids)
+        }
+        return jsonify(result)
+
+    @app.route("/quizzes/sessions/<session_id>/next", methods=['POST'])
+    def next_quiz_question(session_id):
+        question = None
+        try:
+            while question is None:
+                question_id = quiz_sessions.next_id(session_id)
+                if question_id is None:
+                    break
+                # None when the question was deleted during the quiz
+                question = Question.query.get(question_id)
+        except KeyError:
+            abort(404)
+        result = {
+            "success": True,
+            "question": Question.format(question) if question else None
+        }
+        return jsonify(result)
+
+    @app.route("/quizzes/sessions/<session_id>", methods=['DELETE'])
+    def end_quiz_session(session_id):
+        quiz_sessions.end(session_id)
+        return jsonify({"success": True})
+
     '''
     Create error handlers for all expected errors
     including 404 and 422.
@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import tempfile
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+'''
+Test harness of test_flaskr.py, import it before flaskr and models.
+
+Every test worker gets a database of its own, seeded once from
+fixtures/trivia.json, and every test runs in a transaction that is rolled
+back afterwards, so tests neither see each other's writes nor depend on
+the order they run in. The app's commits only release a SAVEPOINT.
+
+By default a worker uses a SQLite file in the temp directory, so no
+postgres is needed and questions are searched with the in-memory index.
+With TEST_DATABASE_URL=postgresql://... each worker uses its own schema
+of that database instead. Under pytest-xdist (pytest -n auto) the worker
+id comes from PYTEST_XDIST_WORKER.
+'''
+
+WORKER = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures', 'trivia.json')
+POSTGRES_URL = os.environ.get('TEST_DATABASE_URL')
+
+if POSTGRES_URL:
+    SCHEMA = 'test_' + WORKER
+    DATABASE_URL = POSTGRES_URL + ('&' if '?' in POSTGRES_URL else '?') + \
+        'options=-csearch_path%3D' + SCHEMA
+    SEARCH_BACKENDS = ('database', 'memory')
+    engine = create_engine(POSTGRES_URL)
+    engine.execute('CREATE SCHEMA IF NOT EXISTS ' + SCHEMA)
+    engine.dispose()
+else:
+    path = os.path.join(tempfile.gettempdir(), 'trivia_test_%s.db' % WORKER)
+    if os.path.exists(path):
+        os.remove(path)
+    DATABASE_URL = 'sqlite:///' + path
+    SEARCH_BACKENDS = ('memory',)
+    os.environ['SEARCH_BACKEND'] = 'memory'
+
+# models binds to DATABASE_URL when it is imported
+os.environ['DATABASE_URL'] = DATABASE_URL
+
+from models import db, Question, Category  # noqa: E402
+
+
+@event.listens_for(Engine, 'connect')
+def sqlite_connect(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        # pysqlite begins transactions on its own and breaks SAVEPOINTs,
+        # leave BEGIN to sqlite_begin
+        dbapi_connection.isolation_level = None
+
+
+@event.listens_for(Engine, 'begin')
+def sqlite_begin(connection):
+    if connection.dialect.name == 'sqlite':
+        connection.execute('BEGIN')
+
+
+seeded = False
+
+
+def load_fixtures(app):
+    '''
+    recreates the tables of the worker's database with the question bank
+    of fixtures/trivia.json, once per worker
+    '''
+    global seeded
+    if seeded:
+        return
+    with open(FIXTURES, encoding='utf-8') as fixtures:
+        bank = json.load(fixtures)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(Category.__table__.insert(), bank['categories'])
+        db.session.execute(Question.__table__.insert(), bank['questions'])
+        if db.engine.dialect.name == 'postgresql':
+            # the rows have explicit ids, move the id sequences on
+            for table in ('questions', 'categories'):
+                db.session.execute(
+                    "SELECT setval(pg_get_serial_sequence('%s', 'id'), "
+                    "(SELECT max(id) FROM %s))" % (table, table))
+        db.session.commit()
+        db.session.remove()
+    Question.clear_caches()
+    Category.changed()
+    seeded = True
+
+
+class Rollback:
+    '''
+    runs everything db.session does until end() in one transaction of a
+    single connection and rolls it back. commits of the app end a
+    SAVEPOINT, after which a new one begins
+    '''
+
+    def __init__(self, app):
+        with app.app_context():
+            self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
+        self.original_session = db.session
+        self.session = db.create_scoped_session(
+            options={'bind': self.connection, 'binds': {}})
+        event.listen(self.session, 'after_transaction_end',
+                     self.restart_savepoint)
+        # flask-sqlalchemy removes the session after every request and
+        # bank.py closes it, keep it open until the test ends
+        self.session.remove = lambda: None
+        self.session.close = self.session.expunge_all
+        db.session = self.session
+        self.session.begin_nested()
+
+    def restart_savepoint(self, session, transaction):
+        if transaction.nested and not transaction._parent.nested:
+            session.expire_all()
+            session.begin_nested()
+
+    def end(self):
+        db.session = self.original_session
+        event.remove(self.session, 'after_transaction_end',
+                     self.restart_savepoint)
+        # the SAVEPOINT first, the connection still has it open otherwise
+        self.session.registry().rollback()
+        self.session.registry().close()
+        self.transaction.rollback()
+        self.connection.close()
+        # the caches may hold rows of the rolled back transaction
+        Question.clear_caches()
+        Category.changed()
@@ -0,0 +1,4 @@
+-- full text search index of search.DatabaseSearch
+-- psql trivia < migrations/0001_question_search_index.sql
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_search ON questions
+USING gin (to_tsvector('simple', coalesce(question, '') || ' ' || coalesce(answer, '')));
@@ -0,0 +1,157 @@
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+'''
+Quiz question selection.
+
+Question.ids(category) keeps the sorted question ids of every category in
+process, so a quiz round samples an id there and loads that one question
+instead of fetching the whole category minus the previous questions.
+'''
+
+# random draws before falling back to listing the unseen ids
+SAMPLE_ATTEMPTS = 8
+
+
+def random_unseen(ids, seen):
+    '''
+    a random id of ids that is not in the set seen, None when every id
+    was seen. while most ids are unseen a few draws find one; only a quiz
+    that went through nearly the whole category lists the remaining ids
+    '''
+    if not ids:
+        return None
+    for _ in range(SAMPLE_ATTEMPTS):
+        candidate = ids[random.randrange(len(ids))]
+        if candidate not in seen:
+            return candidate
+    remaining = [question_id for question_id in ids
+                 if question_id not in seen]
+    if not remaining:
+        return None
+    return random.choice(remaining)
+
+
+'''
+Quiz sessions.
+
+A session holds the questions of one quiz that were not played yet, so
+each round is one "next" call instead of resending previous_questions.
+The session keeps the question ids of its category from the time the quiz
+started, so later inserts and deletes do not shift them; in process that
+is the list of Question.ids(category), shared by every session started
+from it. The remaining questions are a lazily shuffled deck over its
+positions: every draw swaps one position out (Fisher-Yates), and only the
+swapped positions are stored.
+'''
+
+
+def new_deck(size):
+    return {'size': size, 'remaining': size, 'swaps': {}}
+
+
+def draw(deck):
+    '''
+    removes a random position from the deck and returns it, None when
+    the deck is empty
+    '''
+    remaining = deck['remaining']
+    if remaining == 0:
+        return None
+    swaps = deck['swaps']
+    pick = random.randrange(remaining)
+    last = remaining - 1
+    position = swaps.pop(pick, pick)
+    if pick != last:
+        swaps[pick] = swaps.pop(last, last)
+    deck['remaining'] = last
+    return position
+
+
+class MemorySessionStore:
+    '''
+    sessions kept in process, least recently used first out once there
+    are max_sessions of them, and dropped after ttl seconds without use
+    '''
+
+    def __init__(self, max_sessions=10000, ttl=1800):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+        self.evictions = 0
+
+    def get(self, session_id):
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                return None
+            expires, state = entry
+            if expires < time.monotonic():
+                del self.sessions[session_id]
+                return None
+            self.sessions.move_to_end(session_id)
+            return state
+
+    def set(self, session_id, state):
+        with self.lock:
+            self.sessions[session_id] = (time.monotonic() + self.ttl, state)
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+SESSION_STORES = {
+    'memory': MemorySessionStore,
+}
+
+
+class QuizSessions:
+    '''
+    starts quizzes and deals their questions. store is any object with
+    get/set/delete like MemorySessionStore; session states are plain
+    dicts of ints and strings so a shared store can serialize them
+    '''
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+
+    def start(self, category, ids):
+        '''
+        starts a quiz over the question ids of category, ids must not be
+        changed afterwards
+        '''
+        session_id = secrets.token_urlsafe(16)
+        state = {'category': category, 'ids': ids,
+                 'deck': new_deck(len(ids))}
+        self.store.set(session_id, state)
+        return session_id, state
+
+    def next_id(self, session_id):
+        '''
+        the next question id of the session, None when the quiz is over,
+        raises KeyError for an unknown or expired session. the id may
+        belong to a question deleted since the quiz started
+        '''
+        with self.lock:
+            state = self.store.get(session_id)
+            if state is None:
+                raise KeyError(session_id)
+            position = draw(state['deck'])
+            self.store.set(session_id, state)
+        return None if position is None else state['ids'][position]
+
+    def end(self, session_id):
+        self.store.delete(session_id)
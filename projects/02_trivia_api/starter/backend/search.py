@@ -0,0 +1,183 @@
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+
+from sqlalchemy import REAL, and_, cast, func, literal_column, or_
+
+from models import db, Question
+
+'''
+Question search.
+
+A search term is split into words, and a question matches when every
+word starts a word of its question or answer text, ignoring case.
+Results are ordered by rank (best first) and then id, and are paginated
+by seeking past the (rank, id) of the last result of the previous page.
+
+DatabaseSearch runs a postgres full text search, which is served by the
+GIN index ix_questions_search (see models.py and migrations/). The
+'simple' configuration is used so that words are matched as typed,
+without stemming or stop words.
+MemorySearch keeps an inverted index in process, for databases without
+full text search (sqlite, tests). Its rank is the number of times the
+words occur in the question and answer.
+'''
+
+SEARCH_CONFIG = 'simple'
+
+
+def words(text):
+    return re.findall(r'[^\W_]+', (text or '').lower())
+
+
+def searchable_text(question, answer):
+    return (question or '') + ' ' + (answer or '')
+
+
+class DatabaseSearch:
+
+    def __init__(self):
+        self.document = func.to_tsvector(
+            literal_column("'%s'" % SEARCH_CONFIG),
+            func.coalesce(Question.question, '') + ' ' +
+            func.coalesce(Question.answer, ''))
+
+    def query(self, term):
+        tsquery = func.to_tsquery(
+            literal_column("'%s'" % SEARCH_CONFIG),
+            ' & '.join(word + ':*' for word in words(term)))
+        return self.document.op('@@')(tsquery), func.ts_rank(
+            self.document, tsquery)
+
+    def search(self, term, after=None, offset=0, limit=10):
+        '''
+        [(rank, row)] of the page after the (rank, id) pair after, or
+        offset results into the list when after is None. rows are
+        Question.rows() rows
+        '''
+        if not words(term):
+            return []
+        match, rank = self.query(term)
+        query = Question.rows(rank.label('rank')).filter(match)
+        if after is not None:
+            # ts_rank is a real, compare in real precision
+            last_rank = cast(after[0], REAL)
+            query = query.filter(or_(
+                rank < last_rank,
+                and_(rank == last_rank, Question.id > after[1])))
+        rows = query.order_by(rank.desc(), Question.id).offset(
+            offset).limit(limit)
+        return [(row.rank, row) for row in rows]
+
+    def count(self, term):
+        if not words(term):
+            return 0
+        match, _ = self.query(term)
+        return Question.query.filter(match).count()
+
+    def add(self, question):
+        pass
+
+    def remove(self, question_id):
+        pass
+
+    def reset(self):
+        pass
+
+
+class MemorySearch:
+
+    def __init__(self):
+        self.postings = None
+        self.tokens = []
+        self.documents = {}
+
+    def load(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.tokens = []
+        rows = db.session.query(Question.id, Question.question, Question.answer)
+        for question_id, question, answer in rows:
+            self.index(question_id, searchable_text(question, answer), False)
+        self.tokens = sorted(self.postings)
+
+    def index(self, question_id, text, sort=True):
+        counts = defaultdict(int)
+        for word in words(text):
+            counts[word] += 1
+        for word, count in counts.items():
+            if sort and word not in self.postings:
+                insort(self.tokens, word)
+            self.postings[word][question_id] = count
+        self.documents[question_id] = list(counts)
+
+    def add(self, question):
+        if self.postings is None:
+            # not loaded yet, the row will be picked up by load()
+            return
+        self.remove(question.id)
+        self.index(question.id,
+                   searchable_text(question.question, question.answer))
+
+    def remove(self, question_id):
+        if self.postings is None or question_id not in self.documents:
+            return
+        for word in self.documents.pop(question_id):
+            del self.postings[word][question_id]
+            if not self.postings[word]:
+                del self.postings[word]
+                del self.tokens[bisect_left(self.tokens, word)]
+
+    def reset(self):
+        # forget the index, it is rebuilt from the database on the next search
+        self.postings = None
+
+    def prefixed(self, word):
+        # the indexed words starting with word, tokens is sorted
+        start = bisect_left(self.tokens, word)
+        end = bisect_left(self.tokens, word + '\uffff')
+        return self.tokens[start:end]
+
+    def matches(self, term):
+        # {question id: rank} of the questions matching every word
+        if self.postings is None:
+            self.load()
+        ranks = None
+        for word in words(term):
+            found = defaultdict(int)
+            for token in self.prefixed(word):
+                for question_id, count in self.postings[token].items():
+                    found[question_id] += count
+            if ranks is None:
+                ranks = found
+            else:
+                ranks = {question_id: rank + found[question_id]
+                         for question_id, rank in ranks.items()
+                         if question_id in found}
+        return ranks or {}
+
+    def search(self, term, after=None, offset=0, limit=10):
+        hits = sorted((-rank, question_id)
+                      for question_id, rank in self.matches(term).items())
+        start = offset
+        if after is not None:
+            start = bisect_right(hits, (-after[0], after[1]))
+        hits = hits[start:start + limit]
+        rows = Question.rows().filter(
+            Question.id.in_([question_id for _, question_id in hits]))
+        by_id = {row.id: row for row in rows}
+        return [(-rank, by_id[question_id]) for rank, question_id in hits
+                if question_id in by_id]
+
+    def count(self, term):
+        return len(self.matches(term))
+
+
+SEARCH_BACKENDS = {
+    'database': DatabaseSearch,
+    'memory': MemorySearch,
+}
+
+
+def make_search(backend):
+    return SEARCH_BACKENDS[backend]()
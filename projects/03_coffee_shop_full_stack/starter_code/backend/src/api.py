@@ -1,11 +1,13 @@
 import os
-from flask import Flask, request, jsonify, abort, redirect, url_for
+from flask import Flask, request, abort, redirect, url_for
 from sqlalchemy import exc
-import json
 from flask_cors import CORS
 
-from database.models import db_drop_and_create_all, setup_db, Drink
-from auth.auth import AuthError, requires_auth
+from database.models import db_drop_and_create_all, setup_db, Drink, \
+    drink_cache
+from auth.auth import AuthError, requires_policy
+from fastjson import jsonify, response
+from menu import MenuSnapshot
 
 app = Flask(__name__)
 setup_db(app)
@@ -18,6 +20,34 @@ CORS(app)
 '''
 db_drop_and_create_all()
 
+# the serialized menu, rebuilt when a drink changes
+menu = MenuSnapshot(drink_cache)
+
+
+def menu_response(form, public):
+    """
+    menu_response(form, public)
+        the 'short' or 'long' menu snapshot with its ETag
+        304 Not Modified if the request has the ETag in If-None-Match
+        404 if there are no drinks
+    """
+    snapshot = menu.get(form)
+    if snapshot is None:
+        abort(404)
+    body, etag = snapshot
+    if request.if_none_match.contains(etag):
+        result = app.response_class(status=304)
+    else:
+        result = response(body)
+    result.set_etag(etag)
+    if public:
+        result.cache_control.public = True
+    else:
+        result.cache_control.private = True
+    result.cache_control.max_age = 0
+    result.cache_control.must_revalidate = True
+    return result
+
 
 @app.route('/')
 def index():
@@ -33,20 +63,13 @@ def drinks():
         returns status code 200 and json {"success": True, "drinks": drinks}
         where drinks is the list of drinks or
         appropriate status code indicating reason for failure
+        served from the menu snapshot, 304 for a matching If-None-Match
     """
-    drink_data = Drink.query.all()
-    if not drink_data:
-        abort(404)
-    drinks_list = [drink.short() for drink in drink_data]
-    result = {
-        "success": True,
-        "drinks": drinks_list
-    }
-    return jsonify(result)
+    return menu_response('short', public=True)
 
 
 @app.route('/drinks-detail', methods=['GET'])
-@requires_auth('get:drinks-detail')
+@requires_policy('drinks_detail')
 def drinks_detail(jwt):
     """
     GET /drinks-detail
@@ -55,20 +78,13 @@ def drinks_detail(jwt):
         returns status code 200 and json {"success": True, "drinks": drinks}
         where drinks is the list of drinks
         or appropriate status code indicating reason for failure
+        served from the menu snapshot, 304 for a matching If-None-Match
     """
-    drink_data = Drink.query.all()
-    if not drink_data:
-        abort(404)
-    drinks_list = [drink.long() for drink in drink_data]
-    result = {
-        "success": True,
-        "drinks": drinks_list
-    }
-    return jsonify(result)
+    return menu_response('long', public=False)
 
 
 @app.route('/drinks', methods=['POST'])
-@requires_auth('post:drinks')
+@requires_policy('create_drink')
 def create_drink(jwt):
     """
     POST /drinks
@@ -84,7 +100,7 @@ def create_drink(jwt):
     recipe = input_data.get('recipe', None)
     if not title or not recipe:
         abort(422)
-    new_drink = Drink(title=title, recipe=json.dumps(recipe))
+    new_drink = Drink(title=title, recipe=recipe)
     try:
         new_drink.insert()
     except Exception as e:
@@ -98,7 +114,7 @@ def create_drink(jwt):
 
 
 @app.route('/drinks/<int:id>', methods=['PATCH'])
-@requires_auth('patch:drinks')
+@requires_policy('update_drink')
 def update_drink(*args, **kwargs):
     """
     PATCH /drinks/<id>
@@ -121,7 +137,7 @@ def update_drink(*args, **kwargs):
     if title:
         target_drink.title = title
     if recipe:
-        target_drink.recipe = json.dumps(recipe)
+        target_drink.recipe = recipe
     try:
         target_drink.insert()
     except Exception as e:
@@ -135,7 +151,7 @@ def update_drink(*args, **kwargs):
 
 
 @app.route('/drinks/<int:id>', methods=['DELETE'])
-@requires_auth('delete:drinks')
+@requires_policy('delete_drink')
 def delete_drink(*args, **kwargs):
     """
     DELETE /drinks/<id>
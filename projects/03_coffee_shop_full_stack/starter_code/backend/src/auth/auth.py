@@ -1,13 +1,22 @@
-import json
+import os
 from flask import request, _request_ctx_stack
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from .jwks import JWKSCache
+from .policy import Requirement, load_policy
+from .token_cache import TokenCache
 
 
 AUTH0_DOMAIN = 'hs-dev-auth.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'coffee_shop'
+# the signing keys of Auth0, fetched once and refreshed in the background
+jwks = JWKSCache(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+# payloads of verified tokens until they expire, see token_cache.py
+verified_tokens = TokenCache(max_size=10000)
+# the permissions each route requires, see requires_policy()
+POLICY = load_policy(os.path.join(os.path.dirname(__file__), 'policy.json'))
 
 
 # AuthError Exception
@@ -70,13 +79,28 @@ def check_permissions(permission, payload):
         permissions array
         return true otherwise
     """
-    if 'permissions' not in payload:
+    return check_requirement(Requirement([permission]),
+                             TokenCache.permission_set(payload))
+
+
+def check_requirement(requirement, permissions):
+    """
+    check_requirement(requirement, permissions)
+        @INPUTS
+            requirement: a Requirement (see policy.py)
+            permissions: frozenset of the payload permissions,
+                         None if the payload has none
+
+        raises an AuthError like check_permissions
+        return true otherwise
+    """
+    if permissions is None:
         body = {
             'code': 'invalid_claims',
             'description': 'Permissions not included in JWT.'
         }
         raise AuthError(body, 400)
-    elif permission not in payload['permissions']:
+    elif not requirement.allows(permissions):
         body = {
             'code': 'unauthorized',
             'description': 'Permission not found.'
@@ -93,29 +117,26 @@ def verify_decode_jwt(token):
 
         it should be an Auth0 token with key id (kid)
         it should verify the token using Auth0 /.well-known/jwks.json
+        the keys are cached by kid in jwks (see jwks.py)
         it should decode the payload from the token
         it should validate the claims
         return the decoded payload
     """
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         body = {
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }
         raise AuthError(body, 401)
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    try:
+        rsa_key = jwks.get(unverified_header['kid'])
+    except Exception:
+        body = {
+            'code': 'jwks_unavailable',
+            'description': 'Unable to fetch the signing keys.'
+        }
+        raise AuthError(body, 503)
     if not rsa_key:
         body = {
             'code': 'invalid_header',
@@ -152,6 +173,30 @@ def verify_decode_jwt(token):
         raise AuthError(body, 400)
 
 
+def requires(requirement):
+    """
+    requires(requirement)
+        @INPUTS
+            requirement: a Requirement (see policy.py)
+
+        return the decorator which verifies the token of the request,
+        checks its permissions against requirement and passes the decoded
+        payload to the decorated method
+        a token that was verified before is served from verified_tokens
+        with its permission set
+    """
+    def requires_decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            token = get_token_auth_header()
+            payload, permissions = verified_tokens.verify(
+                token, verify_decode_jwt)
+            check_requirement(requirement, permissions)
+            return f(payload, *args, **kwargs)
+        return wrapper
+    return requires_decorator
+
+
 def requires_auth(permission=''):
     """
     requires_auth(permission='')
@@ -165,12 +210,33 @@ def requires_auth(permission=''):
         return the decorator which passes the decoded payload to the decorated
         method
     """
-    def requires_auth_decorator(f):
-        @wraps(f)
-        def wrapper(*args, **kwargs):
-            token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
-            return f(payload, *args, **kwargs)
-        return wrapper
-    return requires_auth_decorator
+    return requires(Requirement(all_of=[permission]))
+
+
+def requires_all(*permissions):
+    """
+    requires_all(*permissions)
+        like requires_auth, the token must have every one of permissions
+    """
+    return requires(Requirement(all_of=permissions))
+
+
+def requires_any(*permissions):
+    """
+    requires_any(*permissions)
+        like requires_auth, the token must have one of permissions at least
+    """
+    return requires(Requirement(any_of=permissions))
+
+
+def requires_policy(name):
+    """
+    requires_policy(name)
+        @INPUTS
+            name: a route name of the RBAC policy table policy.json
+
+        like requires_auth with the permissions POLICY requires for name
+        the rule is looked up once, when the route is decorated
+        raises KeyError if policy.json has no rule for name
+    """
+    return requires(POLICY[name])
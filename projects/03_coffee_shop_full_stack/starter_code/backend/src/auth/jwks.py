@@ -0,0 +1,163 @@
+import json
+import threading
+import time
+from urllib.request import urlopen
+
+
+def fetch_jwks(url, timeout=5):
+    """
+    fetch_jwks(url, timeout=5)
+        the default fetcher of JWKSCache, downloads a JWKS document
+        returns the parsed json
+    """
+    with urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+class JWKSUnavailable(Exception):
+    """
+    JWKSUnavailable Exception
+    no keys were fetched yet and the last attempt failed less than
+    min_refetch_interval seconds ago
+    """
+    pass
+
+
+class JWKSCache:
+    """
+    JWKSCache
+    the signing keys of a JWKS document (/.well-known/jwks.json) indexed
+    by key id (kid), so verifying a token needs no request to Auth0
+
+        the keys are fetched on first use and kept for ttl seconds
+        once they are older than ttl - refresh_ahead seconds, a background
+        thread fetches them again while the old keys are still served
+        a kid that is not known fetches the keys again at once (Auth0
+        rotated its keys), at most once every min_refetch_interval
+        seconds, so tokens with made up kids can not flood Auth0
+        if a fetch fails the old keys are kept and served, without keys
+        the next attempt waits min_refetch_interval seconds as well and
+        get raises JWKSUnavailable until then
+
+        fetch is a callable taking the url and returning the parsed
+        document, e.g. to use a local stand-in JWKS server or no server
+        at all in tests
+    """
+
+    def __init__(self, url, fetch=fetch_jwks, ttl=600, refresh_ahead=60,
+                 min_refetch_interval=10, clock=time.monotonic):
+        self.url = url
+        self.fetch = fetch
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.min_refetch_interval = min_refetch_interval
+        self.clock = clock
+        self.keys = {}
+        self.fetched_at = None
+        self.last_attempt = None
+        self.lock = threading.Lock()
+        self.refreshing = False
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.failed_fetches = 0
+        self.rate_limited = 0
+
+    def get(self, kid):
+        """
+        get(kid)
+            returns the rsa key with the key id kid, or None if the JWKS
+            document has no such key
+            raises the error of the fetcher if no keys could be fetched
+            yet, or JWKSUnavailable while the next attempt has to wait
+        """
+        if self.fetched_at is None:
+            self.refresh()
+        else:
+            age = self.clock() - self.fetched_at
+            if age >= self.ttl:
+                self.refresh()
+            elif age >= self.ttl - self.refresh_ahead:
+                self.refresh_in_background()
+        key = self.keys.get(kid)
+        if key is None:
+            if self.refresh():
+                key = self.keys.get(kid)
+            else:
+                self.rate_limited += 1
+        if key is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return key
+
+    def refresh(self):
+        """
+        refresh()
+            fetches the keys, unless they were fetched or tried less than
+            min_refetch_interval seconds ago
+            returns whether it fetched, raises JWKSUnavailable instead of
+            waiting if there are no keys yet
+        """
+        with self.lock:
+            if self.last_attempt is not None and \
+                    self.clock() - self.last_attempt < \
+                    self.min_refetch_interval:
+                if self.fetched_at is None:
+                    self.rate_limited += 1
+                    raise JWKSUnavailable(self.url)
+                return False
+            self.last_attempt = self.clock()
+            try:
+                document = self.fetch(self.url)
+            except Exception:
+                self.failed_fetches += 1
+                if self.fetched_at is None:
+                    raise
+                return True
+            self.fetches += 1
+            self.keys = self.index(document)
+            self.fetched_at = self.clock()
+            return True
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refreshing or \
+                    self.clock() - self.last_attempt < \
+                    self.min_refetch_interval:
+                return
+            self.refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self.refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @staticmethod
+    def index(document):
+        # the rsa keys of the document by kid
+        keys = {}
+        for key in document.get('keys', []):
+            if 'kid' not in key or key.get('kty') != 'RSA':
+                continue
+            keys[key['kid']] = {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key.get('use'),
+                'n': key['n'],
+                'e': key['e']
+            }
+        return keys
+
+    def stats(self):
+        return {
+            'keys': len(self.keys),
+            'hits': self.hits,
+            'misses': self.misses,
+            'fetches': self.fetches,
+            'failed_fetches': self.failed_fetches,
+            'rate_limited': self.rate_limited
+        }
@@ -0,0 +1,62 @@
+import json
+
+
+class Requirement:
+    """
+    Requirement
+    the permissions a route requires: every permission of all_of and, if
+    any_of is not empty, at least one permission of any_of
+    both are frozensets, so checking the permission set of a token costs
+    the same however many permissions it has
+    """
+
+    def __init__(self, all_of=(), any_of=()):
+        self.all_of = frozenset(all_of)
+        self.any_of = frozenset(any_of)
+
+    def allows(self, permissions):
+        """
+        allows(permissions)
+            whether a frozenset of permissions meets the requirement
+        """
+        return self.all_of <= permissions and \
+            (not self.any_of or not self.any_of.isdisjoint(permissions))
+
+    def __repr__(self):
+        return 'Requirement(all_of={}, any_of={})'.format(
+            sorted(self.all_of), sorted(self.any_of))
+
+
+def load_policy(path):
+    """
+    load_policy(path)
+        reads an RBAC policy table, a json object mapping a route name to
+        the permissions it requires
+        EXAMPLE
+            {"drinks_detail": {"all_of": ["get:drinks-detail"]},
+             "menu_admin": {"any_of": ["patch:drinks", "delete:drinks"]}}
+        returns a dict of the route names and their Requirement
+        raises ValueError if a rule is malformed
+    """
+    with open(path, encoding='utf-8') as policy_file:
+        rules = json.load(policy_file)
+    if not isinstance(rules, dict):
+        raise ValueError('the policy must be a json object')
+    policy = {}
+    for name, rule in rules.items():
+        if not isinstance(rule, dict) or not rule or \
+                set(rule) - {'all_of', 'any_of'}:
+            raise ValueError(
+                'policy rule {!r} must have all_of or any_of only'.format(
+                    name))
+        for permissions in rule.values():
+            # a bare string would become a set of its characters
+            if not isinstance(permissions, list) or \
+                    not all(isinstance(permission, str)
+                            for permission in permissions):
+                raise ValueError(
+                    'policy rule {!r} must list permission strings'.format(
+                        name))
+        policy[name] = Requirement(rule.get('all_of', ()),
+                                   rule.get('any_of', ()))
+    return policy
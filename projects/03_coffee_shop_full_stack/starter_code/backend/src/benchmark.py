@@ -0,0 +1,140 @@
+"""
+Benchmarks for the coffee shop API, run from the src directory:
+
+    python benchmark.py auth
+    DATABASE_URL=sqlite:////tmp/coffee_bench.db python benchmark.py menu
+
+They use a generated RSA key instead of Auth0, nothing is fetched.
+Point DATABASE_URL at a scratch database, api.py drops every table.
+"""
+import base64
+import os
+import sys
+import time
+
+from flask import Flask
+from jose import jwt
+from Crypto.PublicKey import RSA
+
+from auth import auth
+from auth.jwks import JWKSCache
+
+RUNS = 2000
+
+
+def measure(label, fn, runs=RUNS):
+    """
+    measure(label, fn, runs=RUNS)
+        prints the median and max latency of fn over a number of runs
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f'{label:<36} median={timings[len(timings) // 2] * 1000:8.3f}ms '
+          f'max={timings[-1] * 1000:8.3f}ms')
+
+
+def b64_number(number):
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def signed_token(permissions, kid='benchmark'):
+    """
+    signed_token(permissions, kid='benchmark')
+        an Auth0 like token valid for an hour, signed with a new key that
+        auth.jwks serves for kid
+    """
+    key = RSA.generate(2048)
+    auth.jwks = JWKSCache('benchmark', fetch=lambda url: {'keys': [{
+        'kty': 'RSA',
+        'kid': kid,
+        'use': 'sig',
+        'n': b64_number(key.n),
+        'e': b64_number(key.e)
+    }]})
+    claims = {
+        'iss': f'https://{auth.AUTH0_DOMAIN}/',
+        'aud': auth.API_AUDIENCE,
+        'exp': int(time.time()) + 3600,
+        'permissions': permissions
+    }
+    return jwt.encode(claims, key.exportKey().decode('ascii'),
+                      algorithm='RS256', headers={'kid': kid})
+
+
+def bench_auth(app):
+    token = signed_token(['get:drinks-detail'])
+    headers = {'Authorization': f'Bearer {token}'}
+
+    @auth.requires_auth('get:drinks-detail')
+    def protected(payload):
+        return payload
+
+    def uncached():
+        # what requires_auth did for every request before the token cache
+        payload = auth.verify_decode_jwt(auth.get_token_auth_header())
+        auth.check_permissions('get:drinks-detail', payload)
+
+    print('one bearer token presented again and again')
+    with app.test_request_context(headers=headers):
+        measure('verify per request', uncached)
+        auth.verified_tokens.clear()
+        measure('requires_auth with token cache', protected)
+    print('  token cache', auth.verified_tokens.stats())
+
+
+def seed_drinks(num_drinks):
+    """
+    seed_drinks(num_drinks)
+        replaces the drinks with num_drinks drinks of two ingredients
+    """
+    from database.models import db, Drink, drink_cache
+    db.session.query(Drink).delete()
+    db.session.bulk_insert_mappings(Drink, [{
+        'title': f'Drink {i}',
+        'recipe': [
+            {'name': 'milk', 'color': 'white', 'parts': 1},
+            {'name': 'coffee', 'color': 'brown', 'parts': 3}
+        ]
+    } for i in range(num_drinks)])
+    db.session.commit()
+    drink_cache.invalidate()
+
+
+def bench_menu(app, num_drinks=1000):
+    if 'DATABASE_URL' not in os.environ:
+        print('menu: set DATABASE_URL to a scratch database')
+        return
+    token = signed_token(['get:drinks-detail'])
+    # api.py drops and creates the tables of DATABASE_URL
+    import api
+    from database.models import drink_cache
+    seed_drinks(num_drinks)
+    client = api.app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    print(f'drink menu of {num_drinks} drinks')
+    measure('GET /drinks', lambda: client.get('/drinks'), runs=200)
+    etag = client.get('/drinks').headers['ETag']
+    measure('  If-None-Match (304)', lambda: client.get(
+        '/drinks', headers={'If-None-Match': etag}), runs=200)
+    measure('GET /drinks-detail',
+            lambda: client.get('/drinks-detail', headers=headers), runs=200)
+    print('  drink cache', drink_cache.stats())
+    print('  menu snapshot', api.menu.stats())
+
+
+BENCHMARKS = {
+    'auth': bench_auth,
+    'menu': bench_menu,
+}
+
+
+if __name__ == '__main__':
+    app = Flask(__name__)
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name](app)
@@ -0,0 +1,102 @@
+import threading
+
+
+class DrinkCache:
+    """
+    DrinkCache
+    the short() and long() representations of every drink by drink id,
+    so listing the drinks neither queries nor decodes recipes
+
+        loaded from the database on first use
+        Drink.insert(), update() and delete() put or remove their drink
+        invalidate() drops everything, the next lookup reloads
+        the functions in listeners are called after every change
+        the representations are shared, treat them as read-only
+        writes replace the dict of drinks instead of changing it, so a
+        listing can iterate the dict it loaded without the lock
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+        self.drinks = None
+        self.listeners = []
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        with self.lock:
+            if self.drinks is not None:
+                self.hits += 1
+                return self.drinks
+            self.misses += 1
+            rows = self.model.rows().order_by(self.model.id).all()
+            self.drinks = {
+                row.id: (self.model.short_row(row), self.model.long_row(row))
+                for row in rows
+            }
+            return self.drinks
+
+    def short(self):
+        """
+        short()
+            list of the short representations of every drink by id
+        """
+        return [short for short, _ in self.load().values()]
+
+    def long(self):
+        """
+        long()
+            list of the long representations of every drink by id
+        """
+        return [long for _, long in self.load().values()]
+
+    def get(self, drink_id):
+        """
+        get(drink_id)
+            (short, long) representations of a drink, None if not found
+        """
+        return self.load().get(drink_id)
+
+    def loaded(self):
+        return self.drinks is not None
+
+    def put(self, drink):
+        # a drink that was inserted or updated
+        with self.lock:
+            if self.drinks is None:
+                pass
+            elif drink.id not in self.drinks and self.drinks and \
+                    drink.id < next(reversed(self.drinks)):
+                # keep the id order, ids are not reused in practice
+                self.drinks = None
+            else:
+                drinks = dict(self.drinks)
+                drinks[drink.id] = (self.model.short_row(drink),
+                                    self.model.long_row(drink))
+                self.drinks = drinks
+        self.changed()
+
+    def remove(self, drink_id):
+        with self.lock:
+            if self.drinks is not None and drink_id in self.drinks:
+                drinks = dict(self.drinks)
+                del drinks[drink_id]
+                self.drinks = drinks
+        self.changed()
+
+    def invalidate(self):
+        with self.lock:
+            self.drinks = None
+        self.changed()
+
+    def changed(self):
+        for listener in self.listeners:
+            listener()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'drinks': len(self.drinks) if self.drinks is not None else None
+        }
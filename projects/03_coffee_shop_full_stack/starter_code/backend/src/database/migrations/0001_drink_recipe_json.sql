@@ -0,0 +1,4 @@
+-- Drink.recipe from a json string in varchar(180) to a json column
+-- SQLite: nothing to do, JSONType reads the json text the strings hold
+-- postgres: psql coffee < src/database/migrations/0001_drink_recipe_json.sql
+ALTER TABLE "Drink" ALTER COLUMN recipe TYPE jsonb USING recipe::jsonb;
@@ -1,12 +1,16 @@
 import os
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import JSON, TypeDecorator
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from .drink_cache import DrinkCache
+
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(
-    os.path.join(project_dir, database_filename))
+database_path = os.environ.get('DATABASE_URL', "sqlite:///{}".format(
+    os.path.join(project_dir, database_filename)))
 db = SQLAlchemy()
 
 
@@ -31,6 +35,34 @@ def db_drop_and_create_all():
     """
     db.drop_all()
     db.create_all()
+    drink_cache.invalidate()
+
+
+class JSONType(TypeDecorator):
+    """
+    JSONType
+    a json column holding python lists and dicts
+    jsonb on postgres, json on mysql and json text on other databases
+    such as sqlite, which is also what the former String recipes hold
+    """
+    impl = Text
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(JSONB())
+        if dialect.name == 'mysql':
+            return dialect.type_descriptor(JSON())
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name in ('postgresql', 'mysql'):
+            return value
+        return json.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name in ('postgresql', 'mysql'):
+            return value
+        return json.loads(value)
 
 
 class Drink(db.Model):
@@ -44,37 +76,67 @@ class Drink(db.Model):
     id = Column(Integer, primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients, a json list, see JSONType
     # the required data-type is
     # [{'color': string, 'name':string, 'parts':number}]
-    recipe = Column(String(180), nullable=False)
+    recipe = Column(JSONType, nullable=False)
 
     def short(self):
         """
         short()
             short form representation of the Drink model
         """
-        recipe_data = json.loads(self.recipe)
-        # print(recipe_data)
+        return Drink.short_row(self)
+
+    def long(self):
+        """
+        long()
+            long form representation of the Drink model
+        """
+        return Drink.long_row(self)
+
+    @classmethod
+    def rows(cls):
+        """
+        rows()
+            query of the id, title and recipe columns only, its rows
+            format with short_row() and long_row() without hydrating
+            Drink objects
+            EXAMPLE
+                drinks = [Drink.short_row(row) for row in Drink.rows()]
+        """
+        return db.session.query(cls.id, cls.title, cls.recipe)
+
+    @staticmethod
+    def short_row(row):
+        """
+        short_row(row)
+            short form representation of a Drink or a row of rows()
+        """
+        recipe_data = row.recipe
+        # a single ingredient or a list of them
+        if not isinstance(recipe_data, list):
+            recipe_data = [recipe_data]
         short_recipe = [{
-            'color': recipe_data['color'],
-            'parts': recipe_data['parts']
-        }]
+            'color': ingredient['color'],
+            'parts': ingredient['parts']
+        } for ingredient in recipe_data]
         return {
-            'id': self.id,
-            'title': self.title,
+            'id': row.id,
+            'title': row.title,
             'recipe': short_recipe
         }
 
-    def long(self):
+    @staticmethod
+    def long_row(row):
         """
-        long()
-            long form representation of the Drink model
+        long_row(row)
+            long form representation of a Drink or a row of rows()
         """
         return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'id': row.id,
+            'title': row.title,
+            'recipe': row.recipe
         }
 
     def insert(self):
@@ -89,6 +151,7 @@ class Drink(db.Model):
         """
         db.session.add(self)
         db.session.commit()
+        drink_cache.put(self)
 
     def delete(self):
         """
@@ -101,6 +164,7 @@ class Drink(db.Model):
         """
         db.session.delete(self)
         db.session.commit()
+        drink_cache.remove(self.id)
 
     def update(self):
         """
@@ -113,6 +177,10 @@ class Drink(db.Model):
                 drink.update()
         """
         db.session.commit()
+        drink_cache.put(self)
 
     def __repr__(self):
         return json.dumps(self.short())
+
+
+drink_cache = DrinkCache(Drink)
@@ -0,0 +1,119 @@
+"""
+Load test of the public drink menu, run from the src directory:
+
+    DATABASE_URL=sqlite:////tmp/coffee_load.db python loadtest.py
+
+Serves api.py with the werkzeug server in a child process, over
+keep-alive connections, and requests GET /drinks from client threads for
+a number of seconds, once plainly and once with the If-None-Match of the
+menu. Prints the requests per second of both.
+Point DATABASE_URL at a scratch database, api.py drops every table.
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+class KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # headers and body are separate writes, do not wait for acks
+        self.connection.setsockopt(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve(num_drinks, ports):
+    """
+    serve(num_drinks, ports)
+        runs in the child process, seeds the menu and serves api.app on a
+        free port, which it puts on the ports queue
+    """
+    # api.py drops and creates the tables of DATABASE_URL
+    import api
+    from benchmark import seed_drinks
+    seed_drinks(num_drinks)
+    server = make_server('127.0.0.1', 0, api.app, threaded=True,
+                         request_handler=KeepAliveHandler)
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+def hammer(port, path, headers, seconds, threads):
+    """
+    hammer(port, path, headers, seconds, threads)
+        requests path from threads for seconds
+        returns the requests per second and the status codes seen
+    """
+    counts = []
+    statuses = set()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        count = 0
+        while time.perf_counter() < deadline:
+            connection.request('GET', path, headers=headers)
+            result = connection.getresponse()
+            result.read()
+            statuses.add(result.status)
+            count += 1
+        connection.close()
+        counts.append(count)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(counts) / (time.perf_counter() - start), statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--drinks', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--path', default='/drinks')
+    args = parser.parse_args()
+    if 'DATABASE_URL' not in os.environ:
+        sys.exit('set DATABASE_URL to a scratch database')
+
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve, args=(args.drinks, ports), daemon=True)
+    server.start()
+    port = ports.get(timeout=60)
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        connection.request('GET', args.path)
+        etag = connection.getresponse().getheader('ETag')
+        connection.close()
+        print(f'GET {args.path}, {args.drinks} drinks, '
+              f'{args.threads} threads, {args.seconds:.0f}s each')
+        rps, statuses = hammer(port, args.path, {}, args.seconds,
+                               args.threads)
+        print(f'  plain          {rps:8.0f} requests/s  {sorted(statuses)}')
+        if etag:
+            rps, statuses = hammer(port, args.path, {'If-None-Match': etag},
+                                   args.seconds, args.threads)
+            print(f'  If-None-Match  {rps:8.0f} requests/s  '
+                  f'{sorted(statuses)}')
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import hashlib
+import threading
+
+from fastjson import dumps
+
+
+class MenuSnapshot:
+    """
+    MenuSnapshot
+    the response bodies of GET /drinks and /drinks-detail, serialized once
+    with an ETag each, so serving the menu is a dict lookup
+
+        the bodies are built from a DrinkCache on first use
+        every change of the drink cache (Drink.insert(), update() and
+        delete()) rebuilds them at once, invalidate() of the cache drops
+        them until the next request
+        the ETag is a hash of the body, it is the same in every process
+        serving the same menu
+    """
+
+    FORMS = ('short', 'long')
+
+    def __init__(self, drinks):
+        self.drinks = drinks
+        self.lock = threading.Lock()
+        self.bodies = None
+        self.hits = 0
+        self.builds = 0
+        drinks.listeners.append(self.changed)
+
+    def build(self):
+        """
+        build()
+            serializes both bodies from the drink cache
+        """
+        with self.lock:
+            bodies = {}
+            for form in self.FORMS:
+                drinks = getattr(self.drinks, form)()
+                if not drinks:
+                    # 404, there is no menu
+                    bodies[form] = None
+                    continue
+                body = dumps({'success': True, 'drinks': drinks})
+                etag = hashlib.sha1(body).hexdigest()[:20]
+                bodies[form] = (body, etag)
+            self.bodies = bodies
+            self.builds += 1
+            return bodies
+
+    def get(self, form):
+        """
+        get(form)
+            (body, etag) of the 'short' or 'long' menu, None if there are
+            no drinks
+        """
+        bodies = self.bodies
+        if bodies is None:
+            bodies = self.build()
+        else:
+            self.hits += 1
+        return bodies[form]
+
+    def changed(self):
+        if self.drinks.loaded():
+            self.build()
+        else:
+            self.invalidate()
+
+    def invalidate(self):
+        with self.lock:
+            self.bodies = None
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'builds': self.builds,
+            'built': self.bodies is not None
+        }
@@ -0,0 +1,88 @@
+import unittest
+
+from database.drink_cache import DrinkCache
+
+
+class FakeDrink:
+    def __init__(self, id, title):
+        self.id = id
+        self.title = title
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def order_by(self, column):
+        return self
+
+    def all(self):
+        return sorted(self.rows, key=lambda row: row.id)
+
+
+class FakeModel:
+    """
+    FakeModel
+    stands in for Drink: rows() and the short/long representations
+    """
+    id = 'id'
+
+    def __init__(self, *drinks):
+        self.drinks = list(drinks)
+
+    def rows(self):
+        return FakeQuery(self.drinks)
+
+    @staticmethod
+    def short_row(row):
+        return {'id': row.id}
+
+    @staticmethod
+    def long_row(row):
+        return {'id': row.id, 'title': row.title}
+
+
+class DrinkCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.model = FakeModel(FakeDrink(1, 'latte'), FakeDrink(2, 'mocha'))
+        self.cache = DrinkCache(self.model)
+
+    def test_loaded_once(self):
+        self.assertEqual([{'id': 1}, {'id': 2}], self.cache.short())
+        self.assertEqual('mocha', self.cache.get(2)[1]['title'])
+        self.assertEqual(1, self.cache.stats()['misses'])
+
+    def test_put_and_remove(self):
+        self.cache.load()
+        self.cache.put(FakeDrink(3, 'flat white'))
+        self.cache.put(FakeDrink(1, 'iced latte'))
+        self.cache.remove(2)
+        self.assertEqual(['iced latte', 'flat white'],
+                         [drink['title'] for drink in self.cache.long()])
+
+    def test_writes_do_not_change_a_listing_in_progress(self):
+        # a listing iterates the loaded dict without the lock
+        values = iter(self.cache.load().values())
+        next(values)
+        self.cache.put(FakeDrink(3, 'flat white'))
+        self.assertEqual(2, next(values)[0]['id'])
+        values = iter(self.cache.load().values())
+        next(values)
+        self.cache.remove(2)
+        # the listing sees the drinks from when it started
+        self.assertEqual(2, next(values)[0]['id'])
+        self.assertEqual([{'id': 1}, {'id': 3}], self.cache.short())
+
+    def test_listeners_called_after_changes(self):
+        calls = []
+        self.cache.listeners.append(lambda: calls.append(True))
+        self.cache.load()
+        self.cache.put(FakeDrink(3, 'flat white'))
+        self.cache.remove(3)
+        self.cache.invalidate()
+        self.assertEqual(3, len(calls))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+
+from auth.jwks import JWKSCache, JWKSUnavailable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeJWKS:
+    """
+    FakeJWKS
+    a fetcher that serves a JWKS document with the given key ids, or
+    fails while down is set
+    """
+
+    def __init__(self, *kids):
+        self.kids = list(kids)
+        self.down = False
+        self.calls = 0
+
+    def __call__(self, url):
+        self.calls += 1
+        if self.down:
+            raise OSError('jwks server down')
+        return {'keys': [{'kty': 'RSA', 'kid': kid, 'use': 'sig',
+                          'n': 'n', 'e': 'AQAB'} for kid in self.kids]}
+
+
+class JWKSCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.fetch = FakeJWKS('a')
+        self.jwks = JWKSCache('jwks', fetch=self.fetch, ttl=600,
+                              refresh_ahead=60, min_refetch_interval=10,
+                              clock=self.clock)
+        # refresh ahead runs in a thread, run it inline instead
+        self.jwks.refresh_in_background = self.refresh_inline
+        self.background_refreshes = 0
+
+    def refresh_inline(self):
+        self.background_refreshes += 1
+        self.jwks.refresh()
+
+    def test_keys_fetched_once_within_ttl(self):
+        self.assertEqual('a', self.jwks.get('a')['kid'])
+        self.clock.now = 500
+        self.jwks.get('a')
+        self.assertEqual(1, self.fetch.calls)
+        self.assertEqual(0, self.background_refreshes)
+
+    def test_refresh_ahead_of_ttl(self):
+        self.jwks.get('a')
+        self.clock.now = 545
+        self.jwks.get('a')
+        self.assertEqual(1, self.background_refreshes)
+        self.assertEqual(2, self.fetch.calls)
+
+    def test_refresh_after_ttl(self):
+        self.jwks.get('a')
+        self.fetch.kids = ['b']
+        self.clock.now = 600
+        self.assertIsNone(self.jwks.get('a'))
+        self.assertEqual('b', self.jwks.get('b')['kid'])
+        self.assertEqual(2, self.fetch.calls)
+
+    def test_unknown_kid_refetch_is_rate_limited(self):
+        self.jwks.get('a')
+        self.clock.now = 20
+        for _ in range(50):
+            self.assertIsNone(self.jwks.get('made-up'))
+        self.assertEqual(2, self.fetch.calls)
+        self.assertEqual(49, self.jwks.stats()['rate_limited'])
+        self.fetch.kids.append('rotated')
+        self.clock.now = 30
+        self.assertEqual('rotated', self.jwks.get('rotated')['kid'])
+
+    def test_old_keys_served_when_refresh_fails(self):
+        self.jwks.get('a')
+        self.fetch.down = True
+        self.clock.now = 600
+        self.assertEqual('a', self.jwks.get('a')['kid'])
+        self.assertEqual(1, self.jwks.stats()['failed_fetches'])
+
+    def test_cold_start_with_server_down_fails_fast(self):
+        self.fetch.down = True
+        with self.assertRaises(OSError):
+            self.jwks.get('a')
+        for _ in range(50):
+            with self.assertRaises(JWKSUnavailable):
+                self.jwks.get('a')
+        self.assertEqual(1, self.fetch.calls)
+        self.fetch.down = False
+        self.clock.now = 10
+        self.assertEqual('a', self.jwks.get('a')['kid'])
+        self.assertEqual(2, self.fetch.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
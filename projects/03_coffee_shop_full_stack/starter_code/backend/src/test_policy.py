@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+from auth import auth
+from auth.policy import Requirement, load_policy
+
+
+class RequirementTestCase(unittest.TestCase):
+
+    def test_all_of(self):
+        requirement = Requirement(all_of=['get:drinks', 'post:drinks'])
+        self.assertTrue(requirement.allows(
+            frozenset(['get:drinks', 'post:drinks', 'patch:drinks'])))
+        self.assertFalse(requirement.allows(frozenset(['get:drinks'])))
+        self.assertFalse(requirement.allows(frozenset()))
+
+    def test_any_of(self):
+        requirement = Requirement(any_of=['patch:drinks', 'delete:drinks'])
+        self.assertTrue(requirement.allows(frozenset(['delete:drinks'])))
+        self.assertFalse(requirement.allows(frozenset(['get:drinks'])))
+        self.assertFalse(requirement.allows(frozenset()))
+
+    def test_all_of_and_any_of(self):
+        requirement = Requirement(all_of=['get:drinks'],
+                                  any_of=['patch:drinks', 'delete:drinks'])
+        self.assertTrue(requirement.allows(
+            frozenset(['get:drinks', 'patch:drinks'])))
+        self.assertFalse(requirement.allows(frozenset(['patch:drinks'])))
+        self.assertFalse(requirement.allows(frozenset(['get:drinks'])))
+
+
+class LoadPolicyTestCase(unittest.TestCase):
+
+    def load(self, rules):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'policy.json')
+            with open(path, 'w') as policy_file:
+                json.dump(rules, policy_file)
+            return load_policy(path)
+
+    def test_load_policy(self):
+        policy = self.load({
+            'drinks_detail': {'all_of': ['get:drinks-detail']},
+            'menu_admin': {'any_of': ['patch:drinks', 'delete:drinks']}
+        })
+        self.assertTrue(policy['drinks_detail'].allows(
+            frozenset(['get:drinks-detail'])))
+        self.assertTrue(policy['menu_admin'].allows(
+            frozenset(['delete:drinks'])))
+
+    def test_malformed_rules_rejected(self):
+        for rules in (
+                ['drinks_detail'],
+                {'drinks_detail': {}},
+                {'drinks_detail': ['get:drinks-detail']},
+                {'drinks_detail': {'one_of': ['get:drinks-detail']}},
+                {'drinks_detail': {'all_of': 'get:drinks-detail'}},
+                {'drinks_detail': {'any_of': [1, 2]}}):
+            with self.assertRaises(ValueError):
+                self.load(rules)
+
+    def test_shipped_policy(self):
+        self.assertEqual({'drinks_detail', 'create_drink', 'update_drink',
+                          'delete_drink'}, set(auth.POLICY))
+
+
+class RequiresTestCase(unittest.TestCase):
+    """
+    requires* with verify_decode_jwt replaced by a function returning the
+    given payload, so no key or Auth0 is needed
+    """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        auth.verified_tokens.clear()
+
+    def tearDown(self):
+        auth.verified_tokens.clear()
+
+    def call(self, decorator, payload):
+        # returns the status code of the AuthError, or 200
+        @decorator
+        def view(payload):
+            return payload
+
+        headers = {'Authorization': 'Bearer token'}
+        with mock.patch.object(auth, 'verify_decode_jwt',
+                               lambda token: payload), \
+                self.app.test_request_context(headers=headers):
+            try:
+                view()
+            except auth.AuthError as error:
+                self.error = error.error
+                return error.status_code
+        return 200
+
+    def test_requires_all(self):
+        decorator = auth.requires_all('get:drinks', 'post:drinks')
+        self.assertEqual(200, self.call(decorator, {
+            'exp': 2e9, 'permissions': ['get:drinks', 'post:drinks']}))
+        auth.verified_tokens.clear()
+        self.assertEqual(401, self.call(decorator, {
+            'exp': 2e9, 'permissions': ['get:drinks']}))
+        self.assertEqual('unauthorized', self.error['code'])
+
+    def test_requires_any(self):
+        decorator = auth.requires_any('patch:drinks', 'delete:drinks')
+        self.assertEqual(200, self.call(decorator, {
+            'exp': 2e9, 'permissions': ['delete:drinks']}))
+        auth.verified_tokens.clear()
+        self.assertEqual(401, self.call(decorator, {
+            'exp': 2e9, 'permissions': ['get:drinks']}))
+
+    def test_missing_permissions_claim(self):
+        for decorator in (auth.requires_auth('get:drinks-detail'),
+                          auth.requires_any('patch:drinks'),
+                          auth.requires_policy('drinks_detail')):
+            auth.verified_tokens.clear()
+            self.assertEqual(400, self.call(decorator, {'exp': 2e9}))
+            self.assertEqual('invalid_claims', self.error['code'])
+
+    def test_requires_policy_unknown_route(self):
+        with self.assertRaises(KeyError):
+            @auth.requires_policy('unknown_route')
+            def view(payload):
+                return payload
+
+
+if __name__ == '__main__':
+    unittest.main()
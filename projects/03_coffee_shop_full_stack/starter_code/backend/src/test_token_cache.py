@@ -0,0 +1,87 @@
+import unittest
+
+from auth.token_cache import TokenCache
+from test_jwks import FakeClock
+
+
+class FakeVerifier:
+    """
+    FakeVerifier
+    a verify function that returns the payload of a token, or raises
+    for tokens in bad
+    """
+
+    def __init__(self, payloads):
+        self.payloads = payloads
+        self.bad = set()
+        self.calls = 0
+
+    def __call__(self, token):
+        self.calls += 1
+        if token in self.bad:
+            raise ValueError('invalid token')
+        return dict(self.payloads[token])
+
+
+class TokenCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.verify = FakeVerifier({
+            'a': {'sub': 'a', 'exp': 100, 'permissions': ['get:drinks']},
+            'b': {'sub': 'b', 'exp': 100},
+            'c': {'sub': 'c', 'exp': 100},
+            'no-exp': {'sub': 'no-exp'}
+        })
+        self.tokens = TokenCache(max_size=2, clock=self.clock)
+
+    def test_token_verified_once_until_exp(self):
+        payload, permissions = self.tokens.verify('a', self.verify)
+        self.assertEqual('a', payload['sub'])
+        self.assertEqual(frozenset(['get:drinks']), permissions)
+        self.clock.now = 99.9
+        self.tokens.verify('a', self.verify)
+        self.assertEqual(1, self.verify.calls)
+        self.clock.now = 100
+        self.assertIsNone(self.tokens.get('a'))
+        self.assertEqual(1, self.tokens.stats()['expired'])
+        self.tokens.verify('a', self.verify)
+        self.assertEqual(2, self.verify.calls)
+
+    def test_token_without_exp_not_cached(self):
+        payload, permissions = self.tokens.verify('no-exp', self.verify)
+        self.assertEqual('no-exp', payload['sub'])
+        self.assertIsNone(permissions)
+        self.tokens.verify('no-exp', self.verify)
+        self.assertEqual(2, self.verify.calls)
+        self.assertEqual(0, self.tokens.stats()['size'])
+
+    def test_least_recently_used_evicted(self):
+        self.tokens.verify('a', self.verify)
+        self.tokens.verify('b', self.verify)
+        self.tokens.verify('a', self.verify)
+        self.tokens.verify('c', self.verify)
+        self.assertIsNone(self.tokens.get('b'))
+        self.assertIsNotNone(self.tokens.get('a'))
+        self.assertIsNotNone(self.tokens.get('c'))
+        self.assertEqual(1, self.tokens.stats()['evicted'])
+
+    def test_failed_verification_not_cached(self):
+        self.verify.bad.add('a')
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.tokens.verify('a', self.verify)
+        self.assertEqual(2, self.verify.calls)
+        self.assertIsNone(self.tokens.get('a'))
+
+    def test_get_returns_a_copy(self):
+        self.tokens.verify('a', self.verify)
+        payload, permissions = self.tokens.get('a')
+        payload['sub'] = 'changed'
+        payload, permissions = self.tokens.get('a')
+        self.assertEqual('a', payload['sub'])
+        self.assertEqual(frozenset(['get:drinks']), permissions)
+
+
+if __name__ == '__main__':
+    unittest.main()